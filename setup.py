@@ -10,6 +10,11 @@ setup(
     author_email='manitadayon@ucla.edu',
     description='Generate time series data from an arbitrary Bayesian network',
     packages=['tsBNgen'],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'hdf5': ['h5py'],
+        'pandas': ['pandas'],
+    },
     license='MIT',
     long_description=long_description,
     long_description_content_type="text/markdown",
@@ -0,0 +1,105 @@
+import numpy as np
+
+from tsBNgen.tsBNgen import tsBNgen
+
+
+def hybrid(T=12, N=300):
+    # discrete nodes 0-2, continuous nodes 3 and 4 with a continuous parent after t=0
+    Mat = np.array([[0, 1, 1, 1, 1], [0, 0, 1, 1, 1], [0, 0, 0, 1, 1], [0, 0, 0, 0, 0], [0, 0, 0, 0, 0]])
+    CPD = {'0': [0.6, 0.4], '01': [[0.7, 0.3], [0.3, 0.7]], '012': [[0.9, 0.1], [0.4, 0.6], [0.6, 0.4], [0.1, 0.9]],
+           '0123': {'mu0': 5, 'sigma0': 2, 'mu1': 10, 'sigma1': 3, 'mu2': 20, 'sigma2': 2, 'mu3': 50, 'sigma3': 3,
+                    'mu4': 20, 'sigma4': 2, 'mu5': 40, 'sigma5': 3, 'mu6': 50, 'sigma6': 5, 'mu7': 80, 'sigma7': 3},
+           '0124': {'mu0': 500, 'sigma0': 10, 'mu1': 480, 'sigma1': 13, 'mu2': 450, 'sigma2': 10, 'mu3': 400, 'sigma3': 13,
+                    'mu4': 400, 'sigma4': 10, 'mu5': 300, 'sigma5': 10, 'mu6': 250, 'sigma6': 10, 'mu7': 100, 'sigma7': 5}}
+    Parent = {'0': [], '1': [0], '2': [0, 1], '3': [0, 1, 2], '4': [0, 1, 2]}
+    CPD2 = {'00': [[0.6, 0.4], [0.2, 0.8]], '011': [[0.8, 0.2], [0.6, 0.4], [0.7, 0.3], [0.2, 0.8]],
+            '0122': [[0.9, 0.1], [0.7, 0.3], [0.7, 0.3], [0.28, 0.72], [0.7, 0.3], [0.28, 0.72], [0.28, 0.72], [0.1, 0.9]],
+            '01233': {'33': {'coefficient': [np.linspace(0.6, 0.8, 8).tolist()]},
+                      'sigma_intercept': np.linspace(0.6, 3, 8).tolist(), 'sigma': np.linspace(3, 4, 8).tolist()},
+            '01244': {'44': {'coefficient': [np.linspace(0.6, 1.3, 8).tolist()]},
+                      'sigma_intercept': np.linspace(2, 5, 8).tolist(), 'sigma': np.linspace(3, 4, 8).tolist()}}
+    Parent2 = {'0': [0], '1': [0, 1], '2': [0, 1, 2], '3': [0, 1, 2, 3], '4': [0, 1, 2, 4]}
+    loopbacks = {'00': [1], '11': [1], '22': [1], '33': [1], '44': [1]}
+    return tsBNgen(T, N, [2, 2, 2], Mat, ['D', 'D', 'D', 'C', 'C'], CPD, Parent, CPD2, Parent2, loopbacks)
+
+
+_ROWS3 = [[0.7, 0.2, 0.1, 0], [0.6, 0.3, 0.1, 0], [0.3, 0.5, 0.2, 0], [0.3, 0.4, 0.15, 0.15], [0.5, 0.4, 0.05, 0.05],
+          [0.5, 0.4, 0.05, 0.05], [0.25, 0.45, 0.15, 0.15], [0.2, 0.4, 0.3, 0.1], [0.3, 0.5, 0.2, 0],
+          [0.25, 0.45, 0.15, 0.15], [0.1, 0.45, 0.3, 0.15], [0.05, 0.45, 0.3, 0.2], [0.3, 0.4, 0.15, 0.15],
+          [0.2, 0.4, 0.3, 0.1], [0.05, 0.45, 0.3, 0.2], [0.1, 0.3, 0.4, 0.2], [0.35, 0.35, 0.2, 0.1],
+          [0.25, 0.45, 0.2, 0.1], [0.1, 0.2, 0.5, 0.2], [0.05, 0.25, 0.5, 0.2], [0.25, 0.45, 0.2, 0.1],
+          [0.05, 0.35, 0.5, 0.1], [0.05, 0.25, 0.45, 0.25], [0.05, 0.2, 0.35, 0.4], [0.1, 0.2, 0.5, 0.2],
+          [0.05, 0.25, 0.45, 0.25], [0.05, 0.15, 0.3, 0.5], [0.05, 0.1, 0.3, 0.55], [0.05, 0.25, 0.5, 0.2],
+          [0.05, 0.2, 0.35, 0.4], [0.05, 0.1, 0.3, 0.55], [0, 0, 0.2, 0.8]]
+
+
+def loopback(T=12, N=300, discrete=False):
+    # BN_sample_gen_loopback network: node 1 reads itself at lags 1 and 2 from t=2 on
+    CPD = {'0': [0.6, 0.4], '01': [[0.5, 0.3, 0.15, 0.05], [0.1, 0.15, 0.3, 0.45]]}
+    CPD2 = {'00': [[0.7, 0.3], [0.2, 0.8]], '011': [[0.7, 0.2, 0.1, 0], [0.6, 0.3, 0.05, 0.05], [0.35, 0.5, 0.15, 0],
+            [0.2, 0.3, 0.4, 0.1], [0.3, 0.3, 0.2, 0.2], [0.1, 0.2, 0.3, 0.4], [0.05, 0.15, 0.3, 0.5], [0, 0.05, 0.25, 0.7]]}
+    CPD3 = {'00': [[0.7, 0.3], [0.2, 0.8]], '0111': _ROWS3}
+    Parent, Parent2, Parent3 = {'0': [], '1': [0]}, {'0': [0], '1': [0, 1]}, {'0': [0], '1': [0, 1, 1]}
+    Mat = np.array([[0, 1], [0, 0]])
+    Node_Type = ['D', 'D']
+    if not discrete:
+        Mat = np.array([[0, 1, 1], [0, 0, 1], [0, 0, 0]])
+        Node_Type = ['D', 'D', 'C']
+        CPD['012'] = {'mu0': 10, 'sigma0': 2, 'mu1': 30, 'sigma1': 5, 'mu2': 50, 'sigma2': 5, 'mu3': 70, 'sigma3': 5,
+                      'mu4': 15, 'sigma4': 5, 'mu5': 50, 'sigma5': 5, 'mu6': 70, 'sigma6': 5, 'mu7': 90, 'sigma7': 3}
+        CPD2['012'] = dict(CPD['012'])
+        CPD3['012'] = dict(CPD['012'], mu1=20, sigma1=3, mu6=75, sigma6=3)
+        for parents in (Parent, Parent2, Parent3):
+            parents['2'] = [0, 1]
+    return tsBNgen(T, N, [2, 4], Mat, Node_Type, CPD, Parent, CPD2, Parent2, {'00': [1], '11': [1]},
+                   CPD3, Parent3, {'00': [1], '11': [2, 1]})
+
+
+def continuous(T=12, N=300):
+    Mat = np.array([[0, 1, 1, 0], [0, 0, 1, 1], [0, 0, 0, 0], [0, 0, 0, 0]])
+    CPD = {'0': {'mu0': 1, 'sigma0': 2}, '01': {'01': {'coefficient': [[0.5]]}, 'sigma_intercept': [0.3], 'sigma': [1.0]},
+           '012': {'02': {'coefficient': [[0.2]]}, '12': {'coefficient': [[-0.4]]}, 'sigma_intercept': [0.1], 'sigma': [0.5]},
+           '13': {'13': {'coefficient': [[1.5]]}, 'sigma_intercept': [0.2], 'sigma': [0.4]}}
+    CPD2 = {'00': {'00': {'coefficient': [[0.9]]}, 'sigma_intercept': [0.5], 'sigma': [0.5]},
+            '0011': {'01': {'coefficient': [[0.5], [0.3]]}, '11': {'coefficient': [[0.6]]}, 'sigma_intercept': [0.3],
+                     'sigma': [1.0]},
+            '0122': {'02': {'coefficient': [[0.2]]}, '12': {'coefficient': [[-0.4]]}, '22': {'coefficient': [[0.5]]},
+                     'sigma_intercept': [0.1], 'sigma': [0.5]},
+            '13': {'13': {'coefficient': [[1.5]]}, 'sigma_intercept': [0.2], 'sigma': [0.4]}}
+    Parent = {'0': [], '1': [0], '2': [0, 1], '3': [1]}
+    Parent2 = {'0': [0], '1': [0, 0, 1], '2': [0, 1, 2], '3': [1]}
+    loopbacks = {'00': [1], '01': [1], '11': [1], '22': [1]}
+    return tsBNgen(T, N, [], Mat, ['C'] * 4, CPD, Parent, CPD2, Parent2, loopbacks)
+
+
+# (model, use the networks of BN_sample_gen_loopback)
+NETWORKS = {
+    'hybrid': (hybrid, False),
+    'loopback': (loopback, True),
+    'discrete': (lambda T=12, N=300: loopback(T, N, discrete=True), True),
+    'continuous': (continuous, False),
+}
+
+
+def generate(model, use_loopback, **kwargs):
+    gen = model.BN_sample_gen_loopback if use_loopback else model.BN_data_gen
+    return gen(**kwargs).copy()
+
+
+def marginal_z(a, b, Node_Type, N_level):
+    '''
+    z statistics of the differences between the marginals of two samples at every time point: the frequency
+    of every level of a discrete node and the mean of a continuous node.
+    '''
+    z = []
+    for jj, kind in enumerate(Node_Type):
+        values = [a[:, :, jj], b[:, :, jj]]
+        if kind == 'D':
+            stats = [[(x == level).astype(float) for x in values] for level in range(1, N_level[jj] + 1)]
+        else:
+            stats = [values]
+        for x, y in stats:
+            se = np.sqrt(x.var(axis=0) / len(x) + y.var(axis=0) / len(y))
+            diff = x.mean(axis=0) - y.mean(axis=0)
+            z.append(diff[se > 0] / se[se > 0])
+    return np.concatenate(z)
@@ -0,0 +1,78 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from networks import generate, hybrid, loopback, marginal_z
+from tsBNgen.compact import NoisyMAX, NoisyOR, RuleCPD, SparseCPD
+
+# noisy-MAX CPD of node 1 of the loopback network (4 levels) given node 0 and itself at lag 1
+LEAK = [0.7, 0.2, 0.1, 0.0]
+TABLES = [[[1, 0, 0, 0], [0.5, 0.3, 0.2, 0]],
+          [[1, 0, 0, 0], [0.6, 0.4, 0, 0], [0.2, 0.3, 0.5, 0], [0.1, 0.2, 0.3, 0.4]]]
+
+
+def noisy_max_rows():
+    # the node takes the largest of the levels the leak and every parent push it to, independently
+    rows = []
+    for states in itertools.product(range(2), range(4)):
+        row = np.zeros(4)
+        for levels in itertools.product(range(4), repeat=3):
+            row[max(levels)] += LEAK[levels[0]] * np.prod([TABLES[slot][state][level] for slot, (state, level)
+                                                          in enumerate(zip(states, levels[1:]))])
+        rows.append(row.tolist())
+    return rows
+
+
+# (model, CPD2 key, compact CPD, the same CPD written out); the rows of node 2 of the hybrid network are the
+# states of node 0, node 1 and node 2 at lag 1 in the order (1, 1, 1), (1, 1, 2), (1, 2, 1), ..., (2, 2, 2)
+CASES = {
+    'NoisyOR': (hybrid, '0122', NoisyOR([0.8, 0.6, 0.3], leak=0.1),
+                [[0.9, 0.1], [0.63, 0.37], [0.36, 0.64], [0.252, 0.748], [0.18, 0.82], [0.126, 0.874], [0.072, 0.928],
+                 [0.0504, 0.9496]]),
+    'NoisyMAX': (loopback, '011', NoisyMAX(LEAK, TABLES), noisy_max_rows()),
+    'RuleCPD': (hybrid, '0122', RuleCPD([({0: 2, 2: [2]}, [0.1, 0.9]), ({1: 1}, [0.5, 0.5])], default=[0.8, 0.2]),
+                [[0.5, 0.5], [0.5, 0.5], [0.8, 0.2], [0.8, 0.2], [0.5, 0.5], [0.1, 0.9], [0.8, 0.2], [0.1, 0.9]]),
+    'SparseCPD': (hybrid, '0122', SparseCPD([0.9, 0.1], {(2, 2, 1): [0.2, 0.8], (1, 1, 2): [0.05, 0.95]}),
+                  [[0.9, 0.1], [0.05, 0.95], [0.9, 0.1], [0.9, 0.1], [0.9, 0.1], [0.9, 0.1], [0.2, 0.8], [0.9, 0.1]]),
+}
+
+
+def models(name, N=300):
+    factory, key, compact, rows = CASES[name]
+    model, dense = factory(N=N), factory(N=N)
+    model.CPD2[key] = compact
+    dense.CPD2[key] = rows
+    return model, dense, factory is loopback
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_compact_cpd_expands_to_the_dense_table(name):
+    model, dense, _ = models(name)
+    ii = int(CASES[name][1][-1])
+    node = model.compiled_cpd(1)[ii]
+    states = [np.array(column) for column in zip(*itertools.product(*[range(1, level + 1) for level in node.levels]))]
+    expanded = node.probabilities(node.entry(states))
+    assert np.allclose(expanded, CASES[name][3])
+    assert np.allclose(expanded, dense.compiled_cpd(1)[ii].prob)
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+@pytest.mark.parametrize('counter', [False, True])
+def test_compact_cpd_samples_like_the_dense_table(name, counter):
+    model, dense, use_loopback = models(name, N=20000)
+    # a noisy-MAX node is drawn by inversion and a dense table of 4 levels with the alias method, so only the
+    # distributions are the same
+    samples = [generate(m, use_loopback, seed=3, counter=counter) for m in (model, dense)]
+    assert np.abs(marginal_z(*samples, model.Node_Type, model.N_level)).max() < 4
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_compact_cpd_on_the_per_series_path(name):
+    model, dense, use_loopback = models(name, N=20)
+    nodes = []
+    for m in (model, dense):
+        np.random.seed(1)
+        (m.BN_sample_gen_loopback if use_loopback else m.BN_data_gen)(batched=False)
+        nodes.append(m.BN_Nodes)
+    assert nodes[0] == nodes[1]
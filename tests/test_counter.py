@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate
+from tsBNgen.counter import philox4x32
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_counter_mode_generates_any_range(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    full = generate(model, use_loopback, seed=11, counter=True)
+    assert np.array_equal(model.generate_range(97, 211, 11, loopback=use_loopback), full[97:211])
+    assert np.array_equal(model.generate_range(290, 310, 11, loopback=use_loopback)[:10], full[290:])
+    for ii in (0, 150, 299):
+        assert np.array_equal(model.generate_series(ii, 11, loopback=use_loopback), full[ii])
+
+
+@pytest.mark.parametrize('counter, key, expected', [
+    ([0, 0, 0, 0], [0, 0], [0x6627e8d5, 0xe169c58d, 0xbc57ac4c, 0x9b00dbd8]),
+    ([0xffffffff] * 4, [0xffffffff] * 2, [0x408f276d, 0x41c83b0e, 0xa20bc7c6, 0x6d5451fd]),
+    ([0x243f6a88, 0x85a308d3, 0x13198a2e, 0x03707344], [0xa4093822, 0x299f31d0],
+     [0xd16cfe09, 0x94fdcceb, 0x5001e420, 0x24126ea1]),
+])
+def test_philox_known_answers(counter, key, expected):
+    # known-answer vectors of Philox4x32-10 from the Random123 distribution
+    assert [int(word) for word in philox4x32(counter, key)] == expected
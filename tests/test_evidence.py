@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_clamped_weights_are_the_log_likelihood(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    data = generate(model, use_loopback, seed=1)
+    per_series, _ = model.log_likelihood(data, loopback=use_loopback)
+    observations = {jj: data[:, :, jj] for jj in range(data.shape[2])}
+    clamped, log_weights = model.clamped_gen(observations=observations, loopback=use_loopback, seed=4)
+    assert np.array_equal(clamped, data)
+    assert np.allclose(log_weights, per_series)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from networks import hybrid
+
+pd = pytest.importorskip('pandas')
+
+# continuous nodes of the hybrid network
+CONTINUOUS = [3, 4]
+
+
+@pytest.mark.parametrize('output', ['array', 'nodes'])
+def test_dataframe_wraps_the_generated_arrays(output):
+    model = hybrid()
+    model.BN_data_gen(seed=1, output=output)
+    long, wide = model.to_dataframe('long'), model.to_dataframe('wide')
+    for jj in CONTINUOUS:
+        values = model.BN_node_arrays[jj]
+        assert np.shares_memory(long[jj].to_numpy(), values)
+        assert np.array_equal(long[jj].to_numpy(), values.ravel())
+        for tt in (0, model.T - 1):
+            assert np.shares_memory(wide[jj, tt].to_numpy(), values)
+            assert np.array_equal(wide[jj, tt].to_numpy(), values[:, tt])
+    assert np.array_equal(long[0].cat.codes.to_numpy() + 1, model.BN_node_arrays[0].ravel())
+
+
+def test_dataframe_wraps_the_packed_arrays():
+    model = hybrid()
+    packed, offsets = model.BN_data_gen(seed=1, output='nodes', lengths=np.arange(model.N) % 7)
+    frame = model.to_dataframe()
+    for jj in CONTINUOUS:
+        assert np.shares_memory(frame[jj].to_numpy(), packed[jj])
+    assert len(frame) == offsets[-1]
+
+
+@pytest.mark.parametrize('layout', ['long', 'wide'])
+def test_arrow_wraps_contiguous_arrays(layout):
+    pytest.importorskip('pyarrow')
+    model = hybrid()
+    model.BN_data_gen(seed=1, output='nodes')
+    table = model.to_arrow(layout)
+    for jj in CONTINUOUS:
+        column = table.column(str(jj)).chunk(0)
+        if layout == 'wide':
+            column = column.values
+        values = np.frombuffer(column.buffers()[1], dtype=np.float64)
+        assert np.shares_memory(values, model.BN_node_arrays[jj])
+        assert np.array_equal(values, model.BN_node_arrays[jj].ravel())
+
+
+def test_a_new_run_replaces_the_frames_of_the_previous_one():
+    model = hybrid()
+    model.sweep_gen([(None,), (None,)], seed=1)
+    model.BN_data_gen(seed=1, lengths=np.arange(model.N) % 7)
+    assert model.BN_variant is None
+    model.N = 5
+    np.random.seed(3)
+    model.BN_data_gen(batched=False)
+    assert model.BN_array is None and model.BN_node_arrays is None and model.BN_offsets is None
+    frame = model.to_dataframe()
+    assert len(frame) == model.N * model.T
+    for jj in CONTINUOUS:
+        assert np.array_equal(frame[jj].to_numpy(), np.ravel(model.BN_Nodes[jj]))
+    model.BN_data_gen(seed=2)
+    assert np.array_equal(model.to_dataframe()[3].to_numpy(), model.BN_array[:, :, 3].ravel())
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate
+from tsBNgen.fit import fit
+from tsBNgen.plan import ExecutionPlan
+
+
+def assert_close(true, fitted):
+    '''
+    Compare the CPD entry fitted from data with the true one: probabilities within 0.05, means within a quarter
+    of a standard deviation, standard deviations within 15% and coefficients within 0.05.
+    '''
+    if not isinstance(true, dict):
+        assert np.allclose(fitted, true, atol=0.05)
+    elif 'sigma' in true:
+        for key, value in true.items():
+            if isinstance(value, dict):
+                assert np.allclose(fitted[key]['coefficient'], value['coefficient'], atol=0.05)
+        # all of the variance goes to sigma
+        assert np.all(np.asarray(fitted['sigma_intercept']) == 0)
+        assert np.allclose(fitted['sigma'], np.hypot(true['sigma_intercept'], true['sigma']), rtol=0.15)
+    else:
+        for kk in range(len(true) // 2):
+            mu, sigma = true['mu' + str(kk)], true['sigma' + str(kk)]
+            assert abs(fitted['mu' + str(kk)] - mu) < 0.25 * sigma
+            assert abs(fitted['sigma' + str(kk)] - sigma) < 0.15 * sigma
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_fit_recovers_the_cpds(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory(T=12, N=20000)
+    data = generate(model, use_loopback, seed=1)
+    networks = [(model.CPD, model.Parent, None), (model.CPD2, model.Parent2, model.loopbacks)]
+    if use_loopback:
+        networks.append((model.CPD3, model.Parent3, model.loopbacks2))
+        fitted = fit(data, model.Mat, model.Parent, model.Parent2, model.loopbacks, model.Node_Type, model.N_level,
+                     model.Parent3, model.loopbacks2)
+    else:
+        fitted = fit(data, model.Mat, model.Parent, model.Parent2, model.loopbacks, model.Node_Type, model.N_level)
+    assert len(fitted) == len(networks)
+    for (CPD, parents, lags), fitted_cpd in zip(networks, fitted):
+        plan = ExecutionPlan(model.Mat, model.Node_Type, model.N_level, parents, lags)
+        for ii in range(plan.n_nodes):
+            assert_close(CPD[plan.cpd_key(CPD, ii)], fitted_cpd[ii])
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def imported_modules(statement):
+    # in a fresh interpreter, so that the modules imported by the test session do not count
+    result = subprocess.run([sys.executable, '-c', statement + '; import sys; print(" ".join(sys.modules))'],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize('statement', ['import tsBNgen', 'from tsBNgen.tsBNgen import tsBNgen',
+                                       'import tsBNgen.sinks, tsBNgen.fit, tsBNgen.simulator'])
+def test_import_does_not_import_pandas(statement):
+    assert 'pandas' not in imported_modules(statement)
+
+
+def test_pandas_is_imported_on_first_use():
+    pytest.importorskip('pandas')
+    assert 'pandas' in imported_modules('import tsBNgen; tsBNgen.pd')
@@ -0,0 +1,16 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+@pytest.mark.parametrize('counter', [False, True])
+def test_n_jobs_does_not_change_the_output(name, counter):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    single = generate(model, use_loopback, seed=3, block_size=64, counter=counter)
+    assert np.array_equal(generate(model, use_loopback, seed=3, block_size=64, counter=counter, n_jobs=2), single)
+    nodes = (model.BN_sample_gen_loopback if use_loopback else model.BN_data_gen)(seed=3, block_size=64, counter=counter,
+                                                                                  n_jobs=2, output='nodes')
+    assert all(np.array_equal(col, single[:, :, jj]) for jj, col in enumerate(nodes))
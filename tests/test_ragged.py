@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate, hybrid
+
+# lengths of the 300 series of the test networks, some of them empty
+LENGTHS = np.random.default_rng(0).integers(0, 20, 300)
+
+
+def ragged(model, use_loopback, **kwargs):
+    packed, offsets = (model.BN_sample_gen_loopback if use_loopback else model.BN_data_gen)(**kwargs)
+    return packed.copy(), offsets.copy()
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_counter_series_are_prefixes_of_the_full_length_run(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory(T=int(LENGTHS.max()))
+    full = generate(model, use_loopback, seed=6, counter=True)
+    packed, offsets = ragged(model, use_loopback, seed=6, counter=True, lengths=LENGTHS)
+    assert np.array_equal(offsets, np.r_[0, np.cumsum(LENGTHS)])
+    for ii, length in enumerate(LENGTHS):
+        assert np.array_equal(packed[offsets[ii]:offsets[ii + 1]], full[ii, :length])
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+@pytest.mark.parametrize('counter', [False, True])
+def test_zero_lengths(name, counter):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    packed, offsets = ragged(model, use_loopback, seed=6, counter=counter, lengths=np.zeros(model.N, dtype=int))
+    assert packed.shape == (0, len(model.Node_Type))
+    assert np.array_equal(offsets, np.zeros(model.N + 1))
+    nodes, _ = ragged(model, use_loopback, seed=6, counter=counter, output='nodes', lengths=np.zeros(model.N, dtype=int))
+    assert all(col.shape == (0,) for col in nodes)
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+@pytest.mark.parametrize('counter', [False, True])
+def test_n_jobs_does_not_change_the_ragged_output(name, counter):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    packed, offsets = ragged(model, use_loopback, seed=6, block_size=64, counter=counter, lengths=LENGTHS)
+    parallel, parallel_offsets = ragged(model, use_loopback, seed=6, block_size=64, counter=counter, n_jobs=2,
+                                        lengths=LENGTHS)
+    assert np.array_equal(parallel, packed)
+    assert np.array_equal(parallel_offsets, offsets)
+
+
+def test_drawn_lengths_follow_the_seed():
+    model = hybrid()
+    draw = lambda N, rng: rng.integers(0, 20, N)
+    packed, offsets = ragged(model, False, seed=6, lengths=draw)
+    again, again_offsets = ragged(model, False, seed=6, lengths=draw)
+    assert np.array_equal(again_offsets, offsets)
+    assert np.array_equal(again, packed)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate
+
+
+def implicit_regimes(model, use_loopback):
+    # the networks BN_data_gen and BN_sample_gen_loopback switch between
+    regimes = [(0, model.Mat, model.Parent, model.CPD, None), (1, model.Mat, model.Parent2, model.CPD2, model.loopbacks)]
+    if use_loopback:
+        regimes.append((model._loopback_switch(), model.Mat, model.Parent3, model.CPD3, model.loopbacks2))
+    return regimes
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+@pytest.mark.parametrize('counter', [False, True])
+def test_implicit_schedule_reproduces_the_seeded_run(name, counter):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    full = generate(model, use_loopback, seed=7, block_size=64, counter=counter)
+    regimes = implicit_regimes(model, use_loopback)
+    assert np.array_equal(model.regime_gen(regimes, seed=7, block_size=64, counter=counter), full)
+
+    # the same switch given as a schedule, per time point and per series
+    schedule = np.searchsorted([regime[0] for regime in regimes], np.arange(model.T), side='right') - 1
+    assert np.array_equal(model.regime_gen(regimes, schedule, seed=7, block_size=64, counter=counter), full)
+    if not counter:
+        schedule = np.tile(schedule, (model.N, 1))
+        assert np.array_equal(model.regime_gen(regimes, schedule, seed=7, block_size=64), full)
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+@pytest.mark.parametrize('counter', [False, True])
+def test_n_jobs_does_not_change_the_regimes(name, counter):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    regimes = implicit_regimes(model, use_loopback)
+    # the networks of t>0 alternate every 3 time points
+    schedule = np.r_[0, 1 + (np.arange(1, model.T) // 3) % (len(regimes) - 1)]
+    single = model.regime_gen(regimes, schedule, seed=7, block_size=64, counter=counter).copy()
+    assert np.array_equal(model.regime_gen(regimes, schedule, seed=7, block_size=64, counter=counter, n_jobs=2), single)
+    if not counter:
+        # every other series keeps the network of t=1
+        schedule = np.where(np.arange(model.N)[:, None] % 2 == 0, schedule, np.minimum(schedule, 1))
+        single = model.regime_gen(regimes, schedule, seed=7, block_size=64).copy()
+        assert np.array_equal(model.regime_gen(regimes, schedule, seed=7, block_size=64, n_jobs=2), single)
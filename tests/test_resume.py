@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate, hybrid
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+@pytest.mark.parametrize('kwargs', [dict(block_size=100), dict(counter=True)])
+def test_resume_matches_a_longer_run(name, kwargs):
+    factory, use_loopback = NETWORKS[name]
+    longer = generate(factory(T=18, N=400), use_loopback, seed=2, **kwargs)
+    model = factory(T=12, N=300)
+    first = generate(model, use_loopback, seed=2, **kwargs)
+    extended, added = model.resume(extra_T=6, extra_N=100)
+    assert np.array_equal(longer[:300, :12], first)
+    assert np.array_equal(longer[:300, 12:], extended)
+    assert np.array_equal(longer[300:], added)
+    assert (model.N, model.T) == (400, 18)
+
+
+def test_resume_keeps_a_partial_block():
+    model = hybrid()
+    model.BN_data_gen(seed=2, block_size=256)
+    with pytest.raises(ValueError):
+        model.resume(extra_N=10)
@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate
+from tsBNgen.simulator import Simulator
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_simulator_matches_the_seeded_run(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    full = generate(model, use_loopback, seed=5, block_size=100)
+    simulator = Simulator(model, seed=5, loopback=use_loopback, block_size=100)
+    assert np.array_equal(np.stack([simulator.step().copy() for _ in range(model.T)], axis=1), full)
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate, hybrid
+from tsBNgen.sinks import HDF5Sink, NpySink, ParquetSink
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_npy_sink_matches_the_seeded_run(name, tmp_path):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    full = generate(model, use_loopback, seed=5, block_size=100)
+    write_batches = model.write_batches_loopback if use_loopback else model.write_batches
+    sink = write_batches(NpySink(str(tmp_path / 'samples.npy')), batch_size=100, seed=5, block_size=100)
+    assert np.array_equal(np.load(sink.path), full)
+
+
+def test_hdf5_sink_matches_the_seeded_run(tmp_path):
+    h5py = pytest.importorskip('h5py')
+    model = hybrid()
+    full = generate(model, False, seed=5, block_size=100)
+    sink = model.write_batches(HDF5Sink(str(tmp_path / 'samples.h5')), batch_size=100, seed=5, block_size=100)
+    with h5py.File(sink.path, 'r') as f:
+        assert np.array_equal(f[sink.dataset][()], full)
+
+
+def test_parquet_sink_matches_the_seeded_run(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    model = hybrid()
+    full = generate(model, False, seed=5, block_size=100)
+    sink = model.write_batches(ParquetSink(str(tmp_path / 'samples.parquet')), batch_size=100, seed=5, block_size=100)
+    table = pq.read_table(sink.path)
+    assert np.array_equal(table.column('series').to_numpy(), np.repeat(np.arange(model.N), model.T))
+    assert np.array_equal(table.column('time').to_numpy(), np.tile(np.arange(model.T), model.N))
+    for jj in range(full.shape[2]):
+        assert np.array_equal(table.column(str(jj)).to_numpy(), full[:, :, jj].ravel())
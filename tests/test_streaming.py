@@ -0,0 +1,49 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate, hybrid
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_streaming_matches_the_seeded_run(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    full = generate(model, use_loopback, seed=5, block_size=100)
+    suffix = '_loopback' if use_loopback else ''
+
+    batches = getattr(model, 'iter_batches' + suffix)(batch_size=100, seed=5, block_size=100)
+    assert np.array_equal(np.concatenate(list(batches)), full)
+
+    nodes = getattr(model, 'iter_batches' + suffix)(batch_size=100, output='nodes', seed=5, block_size=100)
+    assert np.array_equal(np.concatenate([np.stack(columns, axis=2) for columns in nodes]), full)
+
+    slices = getattr(model, 'iter_slices' + suffix)(seed=5, block_size=100)
+    assert np.array_equal(np.stack([x.copy() for x in slices], axis=1), full)
+
+
+def peak_memory(stream):
+    # a first chunk compiles the sampler, then a fresh run is measured from its first chunk
+    next(stream())
+    tracemalloc.start()
+    for _ in stream():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+@pytest.mark.parametrize('seed', [None, 5])
+@pytest.mark.parametrize('batch_size', [100, 1000])
+def test_streaming_memory_scales_with_batch_size(seed, batch_size):
+    model = hybrid(T=50, N=3000)
+    nbytes = batch_size * model.T * len(model.Node_Type) * np.dtype(np.float64).itemsize
+    assert peak_memory(lambda: model.iter_batches(batch_size=batch_size, seed=seed)) < 4 * nbytes
+
+
+def test_blocks_larger_than_a_batch_are_rejected():
+    model = hybrid()
+    with pytest.raises(ValueError):
+        model.iter_batches(batch_size=100, seed=5, block_size=128)
+    assert len(list(model.iter_batches(batch_size=100, block_size=128))) == 3
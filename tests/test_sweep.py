@@ -0,0 +1,42 @@
+import copy
+
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate, hybrid, marginal_z
+
+
+@pytest.mark.parametrize('counter', [False, True])
+def test_every_variant_has_the_marginals_of_its_cpds(counter):
+    model = hybrid(N=5000)
+    p = [0.1, 0.5, 0.9]
+    variants = [({'0': [q, 1 - q]}, {'00': [[q, 1 - q], [1 - q, q]]}) for q in p]
+    array, variant = model.sweep_gen(variants, seed=2, counter=counter)
+    assert np.array_equal(variant, np.repeat(np.arange(3), model.N))
+    array = array.reshape(3, model.N, model.T, -1)
+    for kk, q in enumerate(p):
+        # the root at t=0 is level 1 with probability q
+        assert abs(np.mean(array[kk, :, 0, 0] == 1) - q) < 4 * np.sqrt(q * (1 - q) / model.N)
+        # every node at every time point, against a run of the model with the CPDs of the variant
+        single = hybrid(N=5000)
+        single.CPD['0'], single.CPD2['00'] = variants[kk][0]['0'], variants[kk][1]['00']
+        reference = generate(single, False, seed=3)
+        assert np.abs(marginal_z(array[kk], reference, model.Node_Type, model.N_level)).max() < 4
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_string_and_int_keys_give_the_same_sweep(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory()
+    cpds = (model.CPD, model.CPD2, model.CPD3)[:3 if use_loopback else 2]
+    # copies of the entries of the model, so that they are compiled for the variant
+    by_string, by_node = [], []
+    for flag, cpd in enumerate(cpds):
+        plan = model.execution_plan(flag)
+        keys = [plan.cpd_key(cpd, ii) for ii in range(plan.n_nodes)]
+        by_string.append({key: copy.deepcopy(cpd[key]) for key in keys})
+        by_node.append({ii: copy.deepcopy(cpd[key]) for ii, key in enumerate(keys)})
+    strings, _ = model.sweep_gen([(None,), tuple(by_string)], loopback=use_loopback, seed=4)
+    strings = strings.copy()
+    ints, _ = model.sweep_gen([(None,), tuple(by_node)], loopback=use_loopback, seed=4)
+    assert np.array_equal(ints, strings)
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from networks import NETWORKS, generate, marginal_z
+
+
+# BN_Nodes of the original implementation (before the batched sampler) with np.random.seed(7), N=2, T=4
+LEGACY = {
+    'hybrid': {
+        0: [[1, 1, 1, 2], [1, 2, 2, 2]],
+        1: [[2, 1, 2, 2], [1, 2, 2, 2]],
+        2: [[2, 1, 1, 2], [1, 2, 2, 2]],
+        3: [[50.27949818293926, 32.57978926092029, 22.099133733785106, 23.248748202412944],
+            [0.4993305436391511, -2.412044908001832, 2.597170283765148, 0.7875526409323705]],
+        4: [[441.6118912185303, 263.20163199959745, 209.66530244491915, 278.7454823450074],
+            [496.2079552349586, 632.0996304311732, 825.4820496759864, 1083.6359662769908]],
+    },
+    'loopback': {
+        0: [[1, 2, 2, 2], [2, 1, 2, 2]],
+        1: [[1, 3, 4, 4], [3, 2, 3, 2]],
+        2: [[13.381051407600712, 67.67031314729584, 88.12371307809973, 89.48535521641284],
+            [71.37229961879981, 22.367377340650798, 68.0134707243165, 49.157436701896394]],
+    },
+}
+
+
+@pytest.mark.parametrize('name', sorted(LEGACY))
+def test_legacy_path_is_unchanged(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory(T=4, N=2)
+    np.random.seed(7)
+    (model.BN_sample_gen_loopback if use_loopback else model.BN_data_gen)(batched=False)
+    assert model.BN_Nodes == LEGACY[name]
+
+
+@pytest.mark.parametrize('name', sorted(NETWORKS))
+def test_batched_marginals_match_the_per_series_path(name):
+    factory, use_loopback = NETWORKS[name]
+    model = factory(T=8, N=2000)
+    np.random.seed(0)
+    (model.BN_sample_gen_loopback if use_loopback else model.BN_data_gen)(batched=False)
+    per_series = np.stack([np.asarray(model.BN_Nodes[jj], dtype=float) for jj in range(len(model.Node_Type))], axis=2)
+    model.N = 20000
+    batched = generate(model, use_loopback, seed=1)
+    z = marginal_z(per_series, batched, model.Node_Type, model.N_level)
+    assert np.abs(z).max() < 4
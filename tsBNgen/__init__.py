@@ -1,4 +1,14 @@
 import numpy as np 
-import pandas as pd 
 from functools import reduce
 
+# pandas is only needed to build or export data frames, it is imported on first use of tsBNgen.pd
+# (or by "from tsBNgen import *") rather than with the package
+__all__ = ['np', 'pd', 'reduce']
+
+
+def __getattr__(name):
+    if name == 'pd':
+        import pandas as pd
+        globals()['pd'] = pd
+        return pd
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
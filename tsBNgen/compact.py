@@ -0,0 +1,196 @@
+import numpy as np
+
+
+class NoisyMAX:
+    '''
+    Noisy-MAX CPD of a discrete node: every discrete parent slot independently pushes the node to some
+    level, a leak does the same, and the node takes the largest of these levels.
+
+    Only the per-parent tables are stored, so the size grows with the sum of the parent levels instead
+    of their product. The probability that the node is at most at level y is the product of the leak and
+    parent cumulative distributions at y, computed for every series when it is sampled.
+
+    Use it in place of the list of rows of the CPD/CPD2/CPD3 entry of the node.
+
+    Parameters
+    -----------
+    leak : list
+        Distribution of the levels of the node when the parents have no effect, e.g. [1, 0, 0] for a
+        node that stays at its first level unless a parent pushes it up.
+
+    tables : list
+        One table per discrete parent slot (in the order of the rows of the full CPD, i.e. the parents
+        and their loopbacks), with one row per level of the parent: the distribution of the level this
+        parent alone pushes the node to. The row of the first level is usually [1, 0, ..., 0].
+
+    Examples
+    -----------
+    >>> CPD2['0122'] = NoisyMAX([0.9, 0.1, 0.0], [[[1, 0, 0], [0.2, 0.5, 0.3]], [[1, 0, 0], [0.6, 0.3, 0.1]]])
+    '''
+    def __init__(self, leak, tables):
+        self.leak = leak
+        self.tables = tables
+
+    def _tables(self, levels):
+        return [np.asarray(table, dtype=float) for table in self.tables]
+
+    def compile(self, node, ii):
+        '''
+        Fill the NodeCPD of node ii.
+
+        Raises
+        -----------
+        ValueError
+            If there is not one table per parent slot or a table does not match the parent levels.
+        '''
+        leak = np.asarray(self.leak, dtype=float)
+        tables = self._tables(node.levels)
+        if len(tables) != len(node.levels):
+            raise ValueError("noisy-MAX CPD of node %d needs one table per parent slot (%d), got %d"
+                             % (ii, len(node.levels), len(tables)))
+        for table, level in zip(tables, node.levels):
+            if table.shape != (level, len(leak)):
+                raise ValueError("noisy-MAX CPD of node %d: a parent with %d levels needs a (%d, %d) table, got %s"
+                                 % (ii, level, level, len(leak), table.shape))
+        # cumulative distributions of the first K-1 levels, the last one is always 1
+        node.leak = np.cumsum(leak)[:-1]
+        node.noisy = [np.ascontiguousarray(np.cumsum(table, axis=1)[:, :-1]) for table in tables]
+        node.n_entry = 0
+
+
+class NoisyOR(NoisyMAX):
+    '''
+    Noisy-OR CPD of a two-level discrete node: level 2 ("on") if the leak or any parent turns it on.
+
+    A parent at its first level has no effect, a parent at any other level turns the node on with its
+    link probability. Use it in place of the list of rows of the CPD/CPD2/CPD3 entry of the node.
+
+    Parameters
+    -----------
+    link : list
+        Link probability of every discrete parent slot, either one value or one value per level of the
+        parent from the second on.
+
+    leak : float
+        Probability that the node is on when no parent is.
+
+    Examples
+    -----------
+    >>> CPD['0123'] = NoisyOR([0.8, 0.6, 0.3], leak=0.01)
+    '''
+    def __init__(self, link, leak=0.0):
+        super().__init__([1.0 - leak, leak], None)
+        self.link = link
+
+    def _tables(self, levels):
+        if len(self.link) != len(levels):
+            # compile reports the mismatch
+            return [None] * len(self.link)
+        tables = []
+        for link, level in zip(self.link, levels):
+            p = np.zeros(level)
+            p[1:] = link
+            tables.append(np.stack([1.0 - p, p], axis=1))
+        return tables
+
+
+class RuleCPD:
+    '''
+    Rule-based (decision tree) CPD of a discrete node: a list of rules, each a condition on the parents
+    and a row, and a default row for the parent states no rule matches.
+
+    The first rule whose condition holds gives the row, so a decision tree is written as one rule per
+    leaf, with the conditions along its path. Only the rows of the rules are stored and the lookup costs
+    at most one comparison per rule condition.
+
+    Use it in place of the list of rows of the CPD/CPD2/CPD3 entry of the node.
+
+    Parameters
+    -----------
+    rules : list
+        (condition, row) pairs. The condition is a dictionary keyed by discrete parent slot (position in
+        the order of the rows of the full CPD, i.e. the parents and their loopbacks) whose values are a
+        level or a list of levels; an empty condition always holds.
+
+    default : list
+        Row of the parent states that match no rule.
+
+    Examples
+    -----------
+    >>> CPD2['0122'] = RuleCPD([({0: 2, 2: [3, 4]}, [0.1, 0.9]), ({1: 1}, [0.5, 0.5])], default=[0.9, 0.1])
+    '''
+    def __init__(self, rules, default):
+        self.rules = rules
+        self.default = default
+
+    def compile(self, node, ii):
+        '''
+        Fill the NodeCPD of node ii.
+
+        Raises
+        -----------
+        ValueError
+            If a condition refers to a parent slot or a level that does not exist.
+        '''
+        rules = []
+        for condition, _ in self.rules:
+            tests = []
+            for slot, levels in condition.items():
+                if not 0 <= slot < len(node.levels):
+                    raise ValueError("rule CPD of node %d: no parent slot %s" % (ii, slot))
+                allowed = np.zeros(node.levels[slot] + 1, dtype=bool)
+                levels = np.atleast_1d(levels)
+                if np.any((levels < 1) | (levels > node.levels[slot])):
+                    raise ValueError("rule CPD of node %d: parent slot %d has levels 1 to %d"
+                                     % (ii, slot, node.levels[slot]))
+                allowed[levels] = True
+                tests.append((slot, allowed))
+            rules.append(tests)
+        node.rules = rules
+        node.set_rows([row for _, row in self.rules] + [self.default], ii)
+
+
+class SparseCPD:
+    '''
+    CPD of a discrete node given as a base row and the parent states whose row differs from it.
+
+    Only the overridden rows are stored; the row of the parent states of every series is found with a
+    binary search among their CPD entries. Use it in place of the list of rows of the CPD/CPD2/CPD3
+    entry of the node.
+
+    Parameters
+    -----------
+    base : list
+        Row of the parent states that are not overridden.
+
+    overrides : dict
+        Row keyed by the tuple of the levels of the discrete parent slots, in the order of the rows of
+        the full CPD (i.e. the parents and their loopbacks).
+
+    Examples
+    -----------
+    >>> CPD2['0122'] = SparseCPD([0.9, 0.1], {(2, 2, 1): [0.2, 0.8], (2, 2, 2): [0.05, 0.95]})
+    '''
+    def __init__(self, base, overrides=None):
+        self.base = base
+        self.overrides = overrides or {}
+
+    def compile(self, node, ii):
+        '''
+        Fill the NodeCPD of node ii.
+
+        Raises
+        -----------
+        ValueError
+            If a key does not give one valid level per parent slot, or the CPD entries do not fit in int64.
+        '''
+        if np.prod(node.levels, dtype=float) >= 2.0 ** 62:
+            raise ValueError("sparse CPD of node %d: too many parent states to encode" % ii)
+        keys = np.array(list(self.overrides), dtype=np.intp).reshape(len(self.overrides), len(node.levels))
+        if keys.size and np.any((keys < 1) | (keys > np.array(node.levels, dtype=np.intp))):
+            raise ValueError("sparse CPD of node %d: every key needs one level per parent slot %s" % (ii, node.levels))
+        codes = (keys - 1) @ node.strides if len(node.levels) else np.zeros(len(keys), dtype=np.intp)
+        order = np.argsort(codes)
+        rows = list(self.overrides.values())
+        node.codes = codes[order]
+        node.set_rows([self.base] + [rows[kk] for kk in order], ii)
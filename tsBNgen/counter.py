@@ -0,0 +1,122 @@
+import numpy as np
+
+_M0 = np.uint64(0xD2511F53)
+_M1 = np.uint64(0xCD9E8D57)
+_W0 = np.uint64(0x9E3779B9)
+_W1 = np.uint64(0xBB67AE85)
+_MASK = np.uint64(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+
+
+def philox4x32(counter, key, rounds=10):
+    '''
+    Philox4x32 block cipher (Salmon et al., "Parallel random numbers: as easy as 1, 2, 3", 2011).
+
+    Parameters
+    -----------
+    counter : list
+        The four 32-bit words of the counter, integers or arrays that broadcast together.
+
+    key : list
+        The two 32-bit words of the key.
+
+    rounds : int
+        Number of rounds.
+
+    Returns
+    -----------
+    list
+        The four 32-bit words of the output, as uint64 arrays.
+    '''
+    c0, c1, c2, c3 = [np.asarray(c, dtype=np.uint64) & _MASK for c in counter]
+    k0, k1 = [np.uint64(k) & _MASK for k in key]
+    for _ in range(rounds):
+        p0 = _M0 * c0
+        p1 = _M1 * c2
+        c0, c1, c2, c3 = (p1 >> _SHIFT) ^ c1 ^ k0, p1 & _MASK, (p0 >> _SHIFT) ^ c3 ^ k1, p0 & _MASK
+        k0 = (k0 + _W0) & _MASK
+        k1 = (k1 + _W1) & _MASK
+    return [c0, c1, c2, c3]
+
+
+class CounterRNG:
+    '''
+    Counter-based stand-in for numpy.random.Generator, for random access to the series of a run.
+
+    Every value is a function of the seed, the index of the series and the number of draws made
+    before it, hashed with Philox4x32-10. The sampler makes the same sequence of draws (one per
+    time point and node) whatever the series, so the series i0..i1-1 generated on their own are
+    exactly the series i0..i1-1 of the full run, and the cost does not depend on i0.
+
+    Only the methods the sampler uses are provided: random, standard_normal and normal. Their
+    first axis is the series axis; a draw of n values is for the first n series (see reorder).
+
+    Parameters
+    -----------
+    seed : int
+        Seed of the run, up to 64 bits.
+
+    start, stop : int
+        Range of series.
+    '''
+    def __init__(self, seed, start, stop):
+        seed = int(seed)
+        self.key = (seed & 0xFFFFFFFF, (seed >> 32) & 0xFFFFFFFF)
+        self.series = np.arange(start, stop, dtype=np.uint64)
+        self.draw = 0
+
+    @property
+    def state(self):
+        '''
+        Position of the generator, enough to restore it with the same seed and range.
+        '''
+        return {'bit_generator': 'CounterRNG', 'draw': self.draw}
+
+    @state.setter
+    def state(self, value):
+        self.draw = int(value['draw'])
+
+    def reorder(self, order):
+        '''
+        Draw the series in the given order, a permutation of 0..stop-start-1, so that a draw of n values
+        covers the first n series of that order, e.g. the series still running when the lengths are ragged.
+        '''
+        self.series = self.series[order]
+
+    def _blocks(self, size):
+        '''
+        Two words of 64 random bits per value of a (n, ...) array, one Philox block each.
+        '''
+        shape = tuple(np.atleast_1d(size))
+        series = self.series[:shape[0]].reshape((-1,) + (1,) * (len(shape) - 1))
+        column = np.arange(int(np.prod(shape[1:], dtype=np.int64)), dtype=np.uint64).reshape(shape[1:])
+        words = philox4x32([series, series >> _SHIFT, self.draw, column], self.key)
+        self.draw += 1
+        return [np.broadcast_to((hi << _SHIFT) | lo, shape) for hi, lo in (words[:2], words[2:])]
+
+    @staticmethod
+    def _uniform(bits):
+        # 53 random bits, in [0, 1)
+        return (bits >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+    def random(self, size):
+        '''
+        Uniform values in [0, 1).
+        '''
+        return self._uniform(self._blocks(size)[0])
+
+    def standard_normal(self, size):
+        '''
+        Standard normal values (Box-Muller).
+        '''
+        bits1, bits2 = self._blocks(size)
+        return np.sqrt(-2.0 * np.log1p(-self._uniform(bits1))) * np.cos(2.0 * np.pi * self._uniform(bits2))
+
+    def normal(self, loc=0.0, scale=1.0):
+        '''
+        Normal values, one per element of the broadcast of loc and scale.
+        '''
+        shape = np.broadcast(np.asarray(loc), np.asarray(scale)).shape
+        if len(shape) == 0:
+            shape = (len(self.series),)
+        return loc + scale * self.standard_normal(shape)
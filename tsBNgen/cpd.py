@@ -0,0 +1,359 @@
+import numpy as np
+
+
+def strides(levels):
+    '''
+    Mixed-radix weights of the discrete parents, the same encoding continous_cpd uses.
+
+    Parameters
+    -----------
+    levels : list
+        Number of levels of every discrete parent (slot).
+
+    Returns
+    -----------
+    ndarray
+        Weight of every parent. The CPD entry is sum((state-1)*weight).
+    '''
+    weights = np.ones(len(levels), dtype=np.intp)
+    for kk in range(len(levels) - 2, -1, -1):
+        weights[kk] = weights[kk + 1] * levels[kk + 1]
+    return weights
+
+
+def alias_table(prob):
+    '''
+    Alias tables (Walker/Vose) of every row of a probability table.
+
+    A level is drawn with one uniform u: k=floor(u*K) is kept if the fraction u*K-k is below
+    accept[row, k], otherwise alias[row, k] is used. All the rows are built together, pairing
+    the smallest and the largest remaining column of each row at every step.
+
+    Parameters
+    -----------
+    prob : ndarray
+        Probability table of shape (rows, K).
+
+    Returns
+    -----------
+    tuple
+        accept (float, (rows, K)) and alias (intp, (rows, K)).
+    '''
+    n, K = prob.shape
+    rows = np.arange(n)
+    scaled = prob * K
+    accept = np.ones((n, K))
+    alias = np.tile(np.arange(K, dtype=np.intp), (n, 1))
+    active = np.ones((n, K), dtype=bool)
+    for _ in range(K - 1):
+        small = np.where(active, scaled, np.inf).argmin(axis=1)
+        large = np.where(active, scaled, -np.inf).argmax(axis=1)
+        accept[rows, small] = scaled[rows, small]
+        alias[rows, small] = large
+        scaled[rows, large] -= 1.0 - scaled[rows, small]
+        active[rows, small] = False
+    return np.clip(accept, 0.0, 1.0), alias
+
+
+class NodeCPD:
+    '''
+    Dense parameter tensors of one node, compiled from a CPD/CPD2/CPD3 entry.
+
+    Attributes
+    -----------
+    kind : string
+        "D" for discrete nodes, "C" for continuous nodes.
+
+    levels : tuple
+        Number of levels of every discrete parent slot.
+
+    strides : ndarray
+        Mixed-radix weights that turn the discrete parent states into a CPD entry.
+
+    n_entry : int
+        Number of CPD entries (product of levels).
+
+    prob : ndarray
+        Probability of each level, shape (n_entry, K) (discrete nodes). As in np.random.multinomial
+        the last level takes whatever mass the other levels leave.
+
+    cum : ndarray
+        Cumulative probabilities of the first K-1 levels, shape (n_entry, K-1) (discrete nodes).
+
+    accept, alias : ndarray
+        Alias tables of prob, shape (n_entry, K) (discrete nodes), see alias_table().
+
+    mu, sigma : ndarray
+        Mean and standard deviation per CPD entry (continuous nodes).
+
+    coef : ndarray
+        Coefficients of the continuous parents, shape (number of continuous parent slots, n_entry).
+        None if the node has no continuous parent.
+
+    params : ndarray
+        The Gaussian parameters stacked per CPD entry, shape (number of parameters, n_entry): mu and sigma,
+        or the coefficients of the continuous parent slots followed by sigma_intercept and sigma, so that
+        the parameters of all the series are gathered at once (continuous nodes).
+
+    sigma_intercept : ndarray
+        Standard deviation of the intercept per CPD entry (continuous nodes with continuous parents).
+
+    codes : ndarray
+        Sorted CPD entries of the overridden rows of a SparseCPD, whose rows are prob[1:] (prob[0] is
+        the base row). None otherwise.
+
+    rules : list
+        Per rule of a RuleCPD, the (parent slot, allowed levels mask) tests; prob has one row per rule
+        followed by the default row. None otherwise.
+
+    leak, noisy : ndarray, list
+        Cumulative distribution of the first K-1 levels of the leak and, per parent slot and level, of
+        the parent contribution of a NoisyMAX/NoisyOR CPD, whose entry() is the cumulative distribution
+        of every series rather than a row. None otherwise.
+
+    variant_rows : int
+        Number of rows of every variant in the tables of a parameter sweep (see stack_cpds): variant k of
+        the CPD uses the rows k*variant_rows to (k+1)*variant_rows-1. 0 if the tables are not stacked.
+
+    The compact forms (tsBNgen.compact) only store their distinct rows: n_entry is the number of rows
+    of prob, and table is only defined for full CPDs.
+    '''
+    def __init__(self, kind, levels):
+        self.kind = kind
+        self.levels = tuple(levels)
+        self.strides = strides(levels)
+        self.n_entry = int(np.prod(levels, dtype=np.int64))
+        self.prob = None
+        self.cum = None
+        self.accept = None
+        self.alias = None
+        self.mu = None
+        self.sigma = None
+        self.coef = None
+        self.params = None
+        self.sigma_intercept = None
+        self.codes = None
+        self.rules = None
+        self.leak = None
+        self.noisy = None
+        self.variant_rows = 0
+
+    def set_rows(self, prob, ii):
+        '''
+        Set the probability rows of a discrete node and the tables derived from them.
+
+        Raises
+        -----------
+        ValueError
+            If a probability row sums to more than one.
+        '''
+        prob = np.array(prob, dtype=float, ndmin=2)
+        cum = np.cumsum(prob[:, :-1], axis=1)
+        if cum.size and np.any(cum[:, -1] > 1.0 + 1e-12):
+            raise ValueError("CPD of node %d has a row whose probabilities sum to more than one" % ii)
+        prob[:, -1] = 1.0 - (cum[:, -1] if cum.size else 0.0)
+        self.prob = np.ascontiguousarray(prob)
+        self.cum = np.ascontiguousarray(cum)
+        self.accept, self.alias = alias_table(self.prob)
+        self.n_entry = len(self.prob)
+
+    @property
+    def table(self):
+        '''
+        Probability table shaped by the parent levels, i.e. levels + (K,).
+        '''
+        return self.prob.reshape(self.levels + (self.prob.shape[1],))
+
+    def entry(self, states, variant=None):
+        '''
+        CPD entry of every series.
+
+        Parameters
+        -----------
+        states : list
+            One integer array of levels (1..N_level) per discrete parent slot.
+
+        variant : ndarray
+            Variant of every series if the tables are stacked (see stack_cpds). None uses the first one.
+
+        Returns
+        -----------
+        ndarray
+            Row of the compiled tensors to use for every series. For noisy-MAX nodes, the cumulative
+            distribution of the first K-1 levels of every series (last axis).
+        '''
+        if self.noisy is not None:
+            cum = self.leak
+            for state, table in zip(states, self.noisy):
+                cum = cum * table[np.asarray(state) - 1]
+            return cum
+        if self.rules is not None:
+            # the first rule that holds wins, so the rules are applied from the last one
+            entry = len(self.rules)
+            for index in range(len(self.rules) - 1, -1, -1):
+                holds = True
+                for slot, allowed in self.rules[index]:
+                    holds = holds & allowed[states[slot]]
+                entry = np.where(holds, index, entry)
+            return entry
+        code = 0
+        for state, weight in zip(states, self.strides):
+            code = code + (state - 1) * weight
+        if self.codes is not None:
+            position = np.searchsorted(self.codes, code)
+            found = np.take(self.codes, position, mode='clip') == code if len(self.codes) else False
+            return np.where(found, position + 1, 0)
+        if self.variant_rows and variant is not None:
+            code = code + variant * self.variant_rows
+        return code
+
+    def probabilities(self, entry):
+        '''
+        Probability of every level for the entries given by entry(), shape entry.shape + (K,) (discrete nodes).
+        '''
+        if self.noisy is None:
+            return self.prob[entry]
+        shape = np.shape(entry)[:-1]
+        return np.diff(np.concatenate([np.zeros(shape + (1,)), entry, np.ones(shape + (1,))], axis=-1), axis=-1)
+
+    def level_prob(self, entry, values):
+        '''
+        Probability of the levels values (1..K) for the entries given by entry() (discrete nodes).
+        '''
+        index = np.asarray(values).astype(np.intp) - 1
+        if self.noisy is None:
+            return self.prob[entry, index]
+        prob = self.probabilities(entry)
+        shape = np.broadcast_shapes(prob.shape[:-1], index.shape)
+        prob = np.broadcast_to(prob, shape + prob.shape[-1:])
+        index = np.broadcast_to(index, shape)
+        return np.take_along_axis(prob, index[..., None], axis=-1)[..., 0]
+
+
+def compile_node(ii, plan, Node_Type, CPD):
+    '''
+    Compile the CPD entry of node ii.
+
+    Parameters
+    -----------
+    ii : int
+        The node.
+
+    plan : ExecutionPlan
+        Structure of the network the CPD belongs to.
+
+    Node_Type : list
+        As given to tsBNgen.
+
+    CPD : dict
+        CPD, CPD2 or CPD3.
+
+    Returns
+    -----------
+    NodeCPD
+
+    Raises
+    -----------
+    ValueError
+        If a probability row sums to more than one, or a compact CPD does not match the parents.
+    '''
+    node = NodeCPD(Node_Type[ii], plan.d_levels[ii])
+    entry = CPD[plan.cpd_key(CPD, ii)]
+    if hasattr(entry, 'compile'):
+        # compact forms of tsBNgen.compact
+        if node.kind != 'D':
+            raise ValueError("compact CPDs are for discrete nodes, node %d is continuous" % ii)
+        entry.compile(node, ii)
+    elif node.kind == 'D':
+        rows = entry if len(plan.parents[ii]) != 0 else [entry]
+        node.set_rows(rows[:node.n_entry], ii)
+    elif len(plan.c_parents[ii]) == 0:
+        node.mu = np.array([entry['mu' + str(kk)] for kk in range(node.n_entry)], dtype=float)
+        node.sigma = np.array([entry['sigma' + str(kk)] for kk in range(node.n_entry)], dtype=float)
+        node.params = np.stack([node.mu, node.sigma])
+    else:
+        node.coef = np.array([np.asarray(edge_entry(entry, jj, ii)['coefficient'][cc], dtype=float)[:node.n_entry]
+                              for jj, cc in zip(plan.c_parents[ii], plan.c_coef[ii])])
+        node.sigma_intercept = np.asarray(entry['sigma_intercept'], dtype=float)[:node.n_entry].copy()
+        node.sigma = np.asarray(entry['sigma'], dtype=float)[:node.n_entry].copy()
+        node.params = np.concatenate([node.coef, [node.sigma_intercept, node.sigma]])
+    return node
+
+
+def edge_entry(entry, jj, ii):
+    '''
+    Coefficients of the continuous parent jj of node ii inside a CPD entry, keyed either by the
+    (parent, child) tuple or by str(parent)+str(child).
+    '''
+    if (jj, ii) in entry:
+        return entry[(jj, ii)]
+    return entry[str(jj) + str(ii)]
+
+
+def compile_cpd(plan, Node_Type, CPD):
+    '''
+    Compile the CPD entries of all the nodes of a network.
+
+    Returns
+    -----------
+    list
+        NodeCPD of every node.
+    '''
+    return [compile_node(ii, plan, Node_Type, CPD) for ii in range(plan.n_nodes)]
+
+
+def _same_tables(node, other):
+    # compact CPDs are only shared when they were compiled from the same CPD entry (same NodeCPD)
+    if node is other:
+        return True
+    if any(getattr(cpd, name) is not None for cpd in (node, other) for name in ('codes', 'rules', 'noisy')):
+        return False
+    if node.kind == 'D':
+        return np.array_equal(node.prob, other.prob)
+    return node.params.shape == other.params.shape and np.array_equal(node.params, other.params)
+
+
+def stack_cpds(variants):
+    '''
+    Stack the compiled CPDs of several variants of a network, for a parameter sweep.
+
+    The variants share the execution plan and differ in their CPD values only. The tables of a node that
+    differs between the variants are concatenated along the CPD entries (see NodeCPD.variant_rows), so
+    that the series of all the variants are sampled together; the nodes that are the same in every
+    variant are kept as they are.
+
+    Parameters
+    -----------
+    variants : list
+        The compiled CPDs (see compile_cpd) of every variant.
+
+    Returns
+    -----------
+    list
+        NodeCPD of every node.
+
+    Raises
+    -----------
+    ValueError
+        If a node has a compact CPD (tsBNgen.compact) that is not the same in every variant.
+    '''
+    stacked = []
+    for ii, nodes in enumerate(zip(*variants)):
+        first = nodes[0]
+        if all(_same_tables(first, node) for node in nodes[1:]):
+            stacked.append(first)
+            continue
+        if any(getattr(node, name) is not None for node in nodes for name in ('codes', 'rules', 'noisy')):
+            raise ValueError("node %d: compact CPDs must be the same in every variant of a sweep" % ii)
+        node = NodeCPD(first.kind, first.levels)
+        node.variant_rows = first.n_entry
+        node.n_entry = first.n_entry * len(nodes)
+        if first.kind == 'D':
+            for name in ('prob', 'cum', 'accept', 'alias'):
+                setattr(node, name, np.concatenate([getattr(cpd, name) for cpd in nodes]))
+        else:
+            for name in ('mu', 'sigma', 'sigma_intercept', 'coef', 'params'):
+                if getattr(first, name) is not None:
+                    setattr(node, name, np.concatenate([getattr(cpd, name) for cpd in nodes], axis=-1))
+        stacked.append(node)
+    return stacked
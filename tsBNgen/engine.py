@@ -0,0 +1,1016 @@
+import ctypes
+import os
+
+import numpy as np
+
+from tsBNgen.counter import CounterRNG
+from tsBNgen.linear import LinearGaussian
+from tsBNgen.markov import JointMarkovChain
+
+# Number of series that share one random generator in a seeded run. A seeded run is identical
+# whatever the number of workers or the chunking, as long as the block size does not change.
+BLOCK_SIZE = 65536
+
+# Discrete nodes with at least this many levels are drawn with alias tables, the others by
+# comparing one uniform with the cumulative probabilities of their CPD entry.
+ALIAS_MIN_LEVELS = 4
+
+# Largest transition table (chain states x joint states of a slice) that is compiled for a network
+# whose nodes are all discrete. Larger networks are sampled node by node. The table is built in about
+# 0.2 microseconds per entry and cached on the model; at this size the chain is as fast as the
+# node-by-node path for a run of 1000 series of length 20 and about twice as fast for large runs.
+MAX_JOINT_ENTRIES = 1 << 16
+
+
+def block_rng(seed, block):
+    '''
+    Random generator of one block of series in a seeded run.
+
+    Parameters
+    -----------
+    seed : int
+        Seed of the run.
+
+    block : int
+        Index of the block; it covers the series block*block_size up to (block+1)*block_size.
+
+    Returns
+    -----------
+    numpy.random.Generator
+        Seeded with the child of SeedSequence(seed) that SeedSequence(seed).spawn() returns at position block.
+    '''
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed, spawn_key=(block,))))
+
+
+def rng_state(rng):
+    '''
+    State of a generator (numpy Generator or CounterRNG), see restore_rng.
+    '''
+    return getattr(rng, 'bit_generator', rng).state
+
+
+def restore_rng(state, seed=None, start=0, stop=0):
+    '''
+    Generator in the given state.
+
+    Parameters
+    -----------
+    state : dict
+        As returned by rng_state.
+
+    seed, start, stop : int
+        Seed and range of series of a CounterRNG state.
+
+    Returns
+    -----------
+    numpy.random.Generator or CounterRNG
+    '''
+    if state['bit_generator'] == 'CounterRNG':
+        rng = CounterRNG(seed, start, stop)
+    else:
+        rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+    getattr(rng, 'bit_generator', rng).state = state
+    return rng
+
+
+def level_dtype(n_level):
+    '''
+    Smallest unsigned integer dtype that holds the levels 1..n_level of a discrete node.
+    '''
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if n_level <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def ragged_offsets(lengths):
+    '''
+    Offsets of series of the given lengths in a packed buffer: series i is in rows offsets[i]..offsets[i+1]-1,
+    as in the offsets of an Arrow list array.
+
+    Returns
+    -----------
+    ndarray
+        int64 array of shape (len(lengths)+1,).
+    '''
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return offsets
+
+
+def _packed_rows(out, offsets, lo, hi):
+    '''
+    Packed values of the series lo..hi-1, either a (rows, nodes) array or a list of per-node (rows,) arrays.
+    '''
+    if isinstance(out, np.ndarray):
+        return out[offsets[lo]:offsets[hi]]
+    return [col[offsets[lo]:offsets[hi]] for col in out]
+
+
+def _rows(out, lo, hi):
+    '''
+    Series lo..hi-1 of an output, either a (N, T, nodes) array or a list of per-node (N, T) arrays.
+    '''
+    if isinstance(out, np.ndarray):
+        return out[lo:hi]
+    return [col[lo:hi] for col in out]
+
+
+def _switch_rows(switch, lo, hi):
+    '''
+    Schedule of the series lo..hi-1: a per-series (N, T) schedule is cut, anything else is shared.
+    '''
+    if np.ndim(switch) == 2:
+        return switch[lo:hi]
+    return switch
+
+
+def _variant_rows(variant, lo, hi):
+    '''
+    Variants of the series lo..hi-1 of a parameter sweep, None outside of sweeps.
+    '''
+    if variant is None:
+        return None
+    return variant[lo:hi]
+
+
+def _shared_empty(shape, dtype):
+    '''
+    Uninitialized array in memory shared with the worker processes of BatchSampler.generate. The memory
+    (a multiprocessing.sharedctypes.RawArray) is the base of the array, so it is freed with the array.
+    '''
+    # imported here rather than at module level to keep the import of the package light
+    from multiprocessing.sharedctypes import RawArray
+
+    dtype = np.dtype(dtype)
+    count = int(np.prod(shape))
+    buffer = RawArray(ctypes.c_char, max(count * dtype.itemsize, 1))
+    return np.frombuffer(buffer, dtype=dtype, count=count).reshape(shape)
+
+
+def _shared_buffer(array):
+    '''
+    RawArray that a contiguous array from _shared_empty starts at, None for any other array.
+    '''
+    base = array
+    while isinstance(base, np.ndarray):
+        base = base.base
+    if (isinstance(base, ctypes.Array) and hasattr(base, '_wrapper') and array.flags.c_contiguous
+            and array.ctypes.data == ctypes.addressof(base)):
+        return base
+    return None
+
+
+def _empty_rows(out, n):
+    '''
+    Uninitialized output of n series with the same layout and dtypes as out.
+    '''
+    if isinstance(out, np.ndarray):
+        return np.empty((n,) + out.shape[1:], dtype=out.dtype)
+    return [np.empty((n,) + col.shape[1:], dtype=col.dtype) for col in out]
+
+
+class BatchSampler:
+    '''
+    Generate all N time series at once.
+
+    The topological order is walked once per time step and every node is sampled for all the series
+    with a single NumPy call; the CPD entry of each series is gathered from its parents' states with
+    array indexing. If all the nodes are continuous the networks are compiled to their VAR form
+    (LinearGaussian) and every time slice is computed with a few matrix products instead. If all the
+    nodes are discrete and the joint transition table has at most max_joint_entries entries, the
+    networks are compiled to a JointMarkovChain and every slice is a single draw per series.
+
+    Lagged parents are read from a ring buffer that holds the last max(loopback)+1 slices of every
+    series, never from the output, so slices() streams a run in O(N x nodes x max_lag) memory.
+    Together with the state of the generator, the ring buffer is all that is needed to continue
+    a run at a later time point (see the history and t0 arguments of sample()).
+
+    Parameters
+    -----------
+    model : tsBNgen
+        The model holding the adjacency matrix, node types and the CPD/Parent/loopbacks dictionaries.
+        Its cached execution plans and compiled CPDs are used.
+
+    max_joint_entries : int
+        Size limit of the joint transition table of an all-discrete network, 0 to disable it.
+        It defaults to model.max_joint_entries.
+
+    networks : list
+        (ExecutionPlan, compiled CPDs) of every network, e.g. the regimes of tsBNgen.regime_gen. By default
+        the networks of the model: CPD/Parent, CPD2/Parent2/loopbacks and CPD3/Parent3/loopbacks2 if any.
+        They share the node types and levels of the model but each has its own adjacency matrix and order.
+        The compiled CPDs can stack the tables of several variants (see stack_cpds), in which case the variant
+        of every series is given to sample(), sample_range() or generate().
+
+    Methods
+    ------------
+    schedule(T, switch=None)
+        Determine which network is used at each time point.
+
+    network(tt, switch=None)
+        Determine which network is used at time point tt.
+
+    allocate(N, T, output='array', dtype=np.float64, shared=False)
+        Preallocate the output of N time series of length T.
+
+    allocate_history(N)
+        Allocate the ring buffer of the last slices of N time series.
+
+    allocate_ragged(lengths, output='array', dtype=np.float64, shared=False)
+        Preallocate the packed output of time series of the given lengths.
+
+    sample(N, T, switch=None, rng=None, out=None, history=None, t0=0, evidence=None, variant=None)
+        Generate N time series of length T.
+
+    sample_ragged(lengths, switch=None, rng=None, out=None)
+        Generate time series of the given lengths into a packed output.
+
+    slices(N, T, switch=None, rng=None)
+        Generate N time series of length T one time slice at a time.
+
+    step(N, tt, flag, rng, history, evidence=None, variant=None)
+        Generate the time point tt of N time series.
+
+    sample_range(start, stop, N, T, switch, seed, out, block_size=BLOCK_SIZE, cache=None, counter=False, state=None,
+                 evidence=None, variant=None)
+        Generate the series start..stop-1 of a seeded run of N time series.
+
+    ragged_range(start, stop, lengths, switch, seed, out, block_size=BLOCK_SIZE, counter=False)
+        Generate the series start..stop-1 of a seeded run of time series of the given lengths.
+
+    generate(N, T, switch, seed, out, n_jobs=1, block_size=BLOCK_SIZE, counter=False, state=None, variant=None, lengths=None)
+        Generate a seeded run of N time series, optionally on several processes.
+
+    log_likelihood(data, switch=None, batch_size=BLOCK_SIZE)
+        Log-probability of every time point of data under the networks.
+    '''
+    def __init__(self, model, max_joint_entries=None, networks=None):
+        # the fast paths of the networks of the model are cached on the model with its compiled CPDs
+        model_networks = networks is None
+        if networks is None:
+            flags = [0, 1, 2] if model.Parent3 else [0, 1]
+            networks = [(model.execution_plan(flag), model.compiled_cpd(flag)) for flag in flags]
+        self.plans = [plan for plan, _ in networks]
+        self.cpds = [cpds for _, cpds in networks]
+        self.orders = [plan.top_order.tolist() for plan in self.plans]
+        self.n_nodes = self.plans[0].n_nodes
+        self.depth = max(plan.max_lag for plan in self.plans) + 1
+        self.Node_Type = list(model.Node_Type)
+        self.N_level = [model.N_level[ii] if model.Node_Type[ii] == 'D' else 0 for ii in range(self.n_nodes)]
+        # the fast paths compile one set of parameters per network, stacked variants are sampled node by node
+        stacked = any(cpd.variant_rows for cpds in self.cpds for cpd in cpds)
+        self.linear = None
+        if not stacked and all(kind == 'C' for kind in self.Node_Type):
+            if model_networks:
+                self.linear = [model.linear_form(flag) for flag in flags]
+            else:
+                self.linear = [LinearGaussian(plan, cpds) for plan, cpds in zip(self.plans, self.cpds)]
+        if max_joint_entries is None:
+            max_joint_entries = model.max_joint_entries
+        self.markov = None
+        if not stacked and all(kind == 'D' for kind in self.Node_Type):
+            depth = max(plan.max_lag for plan in self.plans)
+            # python integers, the number of joint states of a large network overflows int64
+            n_states = 1
+            for level in self.N_level:
+                n_states *= level
+            if n_states ** (depth + 1) <= max_joint_entries:
+                if model_networks:
+                    self.markov = [model.markov_chain(flag, depth) for flag in flags]
+                else:
+                    self.markov = [JointMarkovChain(plan, cpds, self.N_level, depth)
+                                   for plan, cpds in zip(self.plans, self.cpds)]
+
+    def allocate(self, N, T, output='array', dtype=np.float64, shared=False):
+        '''
+        Preallocate the output of N time series of length T.
+
+        Parameters
+        ------------
+        N, T : int
+            Number and length of the time series.
+
+        output : string
+            "array" for a single (N, T, number of nodes) array of the given dtype, "nodes" for one
+            (N, T) array per node where discrete nodes use the smallest unsigned integer dtype
+            (uint8/uint16) that holds their levels and continuous nodes use dtype.
+
+        dtype : dtype
+            Floating point dtype of the continuous nodes (float32 or float64).
+
+        shared : bool
+            Allocate the arrays in shared memory, into which the worker processes of generate() write
+            directly instead of going through a copy. The memory is freed with the arrays.
+
+        Returns
+        ------------
+        tuple
+            The (N, T, number of nodes) array (None if output is "nodes") and the list of per-node arrays
+            (views into the array if output is "array").
+        '''
+        empty = _shared_empty if shared else np.empty
+        if output == 'array':
+            array = empty((N, T, self.n_nodes), dtype=dtype)
+            return array, [array[:, :, ii] for ii in range(self.n_nodes)]
+        if output == 'nodes':
+            return None, [empty((N, T), dtype=level_dtype(self.N_level[ii]) if self.Node_Type[ii] == 'D' else dtype)
+                          for ii in range(self.n_nodes)]
+        raise ValueError("output must be 'array' or 'nodes'")
+
+    def allocate_history(self, N):
+        '''
+        Allocate the ring buffer of the last slices of N time series.
+
+        Returns
+        ------------
+        ndarray
+            Array of shape (max(loopback)+1, N, number of nodes); the slice of time t is stored at t % (max(loopback)+1).
+        '''
+        return np.zeros((self.depth, N, self.n_nodes))
+
+    def allocate_ragged(self, lengths, output='array', dtype=np.float64, shared=False):
+        '''
+        Preallocate the packed output of time series of the given lengths: the time points of all the series
+        one after the other, series by series, and their offsets (see ragged_offsets).
+
+        Parameters
+        ------------
+        lengths : ndarray
+            Length of every time series.
+
+        output, dtype, shared :
+            See allocate(). The array has shape (sum(lengths), number of nodes) and the per-node arrays
+            shape (sum(lengths),).
+
+        Returns
+        ------------
+        tuple
+            The packed array (None if output is "nodes"), the list of packed per-node arrays and the offsets.
+        '''
+        offsets = ragged_offsets(lengths)
+        array, columns = self.allocate(1, int(offsets[-1]), output, dtype, shared)
+        if array is not None:
+            array = array[0]
+        return array, [col[0] for col in columns], offsets
+
+    def schedule(self, T, switch=None):
+        '''
+        Determine which network is used at each time point.
+
+        Parameters
+        ------------
+        T : int
+            Length of each time series.
+
+        switch : int or ndarray
+            Time point at which CPD3/Parent3/loopbacks2 take over. None means CPD2 is used after t=0.
+            An integer array gives the index of the network directly, either per time point (shape (T,))
+            or per series and time point (shape (N, T)).
+
+        Returns
+        ------------
+        list
+            Index of the network (0, 1 or 2 for the networks of the model) for every time point. With a
+            per-series schedule, the time points where the series do not all use the same network hold
+            the (N,) array of their networks instead.
+
+        Raises
+        ------------
+        ValueError
+            If a loopback reaches before the start of the time series.
+        '''
+        if np.ndim(switch) == 0:
+            return [self.network(tt, switch) for tt in range(T)]
+        flags = np.asarray(switch, dtype=np.intp)
+        if flags.shape[-1] != T or np.any((flags < 0) | (flags >= len(self.plans))):
+            raise ValueError("the schedule should give one of the %d networks for each of the %d time points"
+                             % (len(self.plans), T))
+        # the whole schedule is checked here, once, rather than at every step
+        reach = np.array([plan.max_lag for plan in self.plans])[flags] > np.arange(T)
+        if reach.any():
+            tt = int(np.flatnonzero(reach.reshape(-1, T).any(axis=0))[0])
+            raise ValueError("loopback of %d reaches before the initial time at t=%d"
+                             % (max(self.plans[flag].max_lag for flag in np.unique(flags[..., tt])), tt))
+        if flags.ndim == 1:
+            return flags.tolist()
+        shared = (flags == flags[:1]).all(axis=0)
+        return [int(flags[0, tt]) if shared[tt] else flags[:, tt] for tt in range(T)]
+
+    def network(self, tt, switch=None):
+        '''
+        Index of the network (0, 1 or 2) used at time point tt when switch is an int or None, see schedule().
+        '''
+        flag = 0 if tt == 0 else (1 if switch is None or tt < switch else 2)
+        if self.plans[flag].max_lag > tt:
+            raise ValueError("loopback of %d reaches before the initial time at t=%d"
+                             % (self.plans[flag].max_lag, tt))
+        return flag
+
+    def sample(self, N, T, switch=None, rng=None, out=None, history=None, t0=0, evidence=None, variant=None):
+        '''
+        Generate N time series of length T, or their time points t0..T-1 if the run is continued.
+
+        Parameters
+        ------------
+        N : int
+            Number of time series.
+
+        T : int
+            Length of each time series.
+
+        switch : int or ndarray
+            See schedule(). A per-series schedule has one row per series.
+
+        rng : numpy.random.Generator
+            Source of randomness. It defaults to a generator seeded from the global numpy state,
+            so np.random.seed() keeps the output reproducible.
+
+        out : ndarray or list
+            A (N, T-t0, number of nodes) array or per-node (N, T-t0) arrays to write into, e.g. from allocate().
+            A (N, T-t0, number of nodes) float64 array is allocated if None.
+
+        history : ndarray
+            Ring buffer from allocate_history(). It holds the slices before t0 when the run is continued,
+            and the last slices of the run when sample() returns.
+
+        t0 : int
+            First time point to generate. rng and history must be the ones a run that stopped at t0 left.
+
+        evidence : Evidence
+            Interventions and observations, see step().
+
+        variant : ndarray
+            Variant of every series when the CPDs are stacked (see stack_cpds), shape (N,).
+
+        Returns
+        ------------
+        ndarray or list
+            out, or the allocated array if out is None. Discrete nodes hold their level (1..N_level).
+        '''
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(np.iinfo(np.int32).max))
+        if out is None:
+            out, _ = self.allocate(N, T - t0)
+        if history is None:
+            history = self.allocate_history(N)
+        array, columns = None, out
+        if isinstance(out, np.ndarray):
+            array, columns = out, [out[:, :, ii] for ii in range(self.n_nodes)]
+        flags = self.schedule(T, switch)
+        if self._markov_run(flags, evidence):
+            self._sample_markov(N, flags, rng, columns, array, history, t0)
+            return out
+        for tt, x in enumerate(self._slices(N, flags, rng, history, t0, evidence, variant)):
+            if array is not None:
+                array[:, tt] = x
+            else:
+                for ii in range(self.n_nodes):
+                    columns[ii][:, tt] = x[:, ii]
+        return out
+
+    def sample_ragged(self, lengths, switch=None, rng=None, out=None):
+        '''
+        Generate time series of the given lengths into a packed output.
+
+        The series are sorted by decreasing length so that the ones still running at time t are the first ones
+        of the ring buffer: every step is computed for these only, and a series is retired as soon as it ends.
+        Each slice is written straight to the packed position of its series.
+
+        Parameters
+        ------------
+        lengths : ndarray
+            Length of every time series.
+
+        switch : int or ndarray
+            See schedule(), for the length of the longest series. A per-series schedule has one row per series.
+
+        rng : numpy.random.Generator or CounterRNG
+            Source of randomness, see sample(). A CounterRNG of the series is reordered by length.
+
+        out : ndarray or list
+            Packed output to write into, from allocate_ragged(). A float64 array is allocated if None.
+
+        Returns
+        ------------
+        ndarray or list
+            out, or the allocated array if out is None.
+        '''
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(np.iinfo(np.int32).max))
+        if out is None:
+            out, _, _ = self.allocate_ragged(lengths)
+        N = len(lengths)
+        order = np.argsort(-lengths, kind='stable')
+        starts = ragged_offsets(lengths)[:-1][order]
+        T = int(lengths.max()) if N else 0
+        # number of series still running at every time point
+        alive = N - np.searchsorted(np.sort(lengths), np.arange(T), side='right')
+        flags = self.schedule(T, switch[order] if np.ndim(switch) == 2 else switch)
+        if isinstance(rng, CounterRNG):
+            rng.reorder(order)
+        history = self.allocate_history(N)
+        for tt in range(T):
+            n = int(alive[tt])
+            flag = flags[tt] if np.ndim(flags[tt]) == 0 else flags[tt][:n]
+            x = self.step(n, tt, flag, rng, history[:, :n])
+            rows = starts[:n] + tt
+            if isinstance(out, np.ndarray):
+                out[rows] = x
+            else:
+                for ii in range(self.n_nodes):
+                    out[ii][rows] = x[:, ii]
+        return out
+
+    def slices(self, N, T, switch=None, rng=None):
+        '''
+        Generate N time series of length T one time slice at a time.
+
+        The slices are the same as the ones sample() writes with the same generator.
+
+        Parameters
+        ------------
+        N, T, switch, rng :
+            See sample().
+
+        Yields
+        ------------
+        ndarray
+            The slice of every series at t=0, 1, ..., T-1, shape (N, number of nodes). It is a view
+            into the ring buffer and is overwritten max(loopback)+1 slices later; copy it to keep it.
+        '''
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(np.iinfo(np.int32).max))
+        return self._slices(N, self.schedule(T, switch), rng, self.allocate_history(N))
+
+    def step(self, N, tt, flag, rng, history, evidence=None, variant=None):
+        '''
+        Generate the time point tt of N time series. Calling it for tt=t0, t0+1, ... gives the same slices
+        as sample() with the same generator and ring buffer.
+
+        Parameters
+        ------------
+        N : int
+            Number of time series.
+
+        tt : int
+            Time point.
+
+        flag : int or ndarray
+            Network to use, see network(), or the (N,) array of the network of every series. The series
+            of every network are then gathered from the ring buffer, stepped together and written back.
+
+        rng : numpy.random.Generator
+            Source of randomness.
+
+        history : ndarray
+            Ring buffer from allocate_history() holding the slices before tt.
+
+        evidence : Evidence
+            Values to force on some nodes; the log-weights of observations are added to evidence.log_weight.
+            The node-by-node path is used, so a node is drawn and then replaced by its forced value.
+
+        variant : ndarray
+            Variant of every series when the CPDs are stacked (see stack_cpds).
+
+        Returns
+        ------------
+        ndarray
+            The slice, shape (N, number of nodes). It is stored in history.
+        '''
+        x = history[tt % self.depth]
+        if np.ndim(flag) != 0:
+            if evidence is not None or isinstance(rng, CounterRNG):
+                raise ValueError("evidence and counter-based generators need the same network for all the series")
+            for network in np.flatnonzero(np.bincount(flag, minlength=len(self.plans))):
+                rows = np.flatnonzero(flag == network)
+                part = history[:, rows]
+                self.step(len(rows), tt, int(network), rng, part, variant=None if variant is None else variant[rows])
+                history[:, rows] = part
+            return x
+        if self.linear is not None and evidence is None:
+            z = rng.standard_normal((N, self.n_nodes))
+            return self.linear[flag].step(z, [history[(tt - lag) % self.depth] for lag in range(1, self.depth)], out=x,
+                                          exact=isinstance(rng, CounterRNG))
+        if self.markov is not None and evidence is None:
+            chain = self.markov[flag]
+            x[...] = chain.decode[chain.step(self._markov_state(history, tt), rng.random(N))]
+            return x
+        plan, cpds = self.plans[flag], self.cpds[flag]
+        for ii in self.orders[flag]:
+            x[:, ii] = self._draw(plan, ii, cpds[ii], history, tt, N, rng, variant)
+            if evidence is not None:
+                self._clamp(plan, ii, cpds[ii], history, tt, N, x, evidence, variant)
+        return x
+
+    def _markov_run(self, flags, evidence):
+        # the joint-state chain runs all the series through the same network at every step
+        return self.markov is not None and evidence is None and all(np.ndim(flag) == 0 for flag in flags)
+
+    def _slices(self, N, flags, rng, history, t0=0, evidence=None, variant=None):
+        if self._markov_run(flags, evidence):
+            return self._markov_slices(N, flags, rng, history, t0)
+        return (self.step(N, tt, flags[tt], rng, history, evidence, variant) for tt in range(t0, len(flags)))
+
+    def sample_range(self, start, stop, N, T, switch, seed, out, block_size=BLOCK_SIZE, cache=None, counter=False, state=None,
+                     evidence=None, variant=None):
+        '''
+        Generate the series start..stop-1 of a seeded run of N time series.
+
+        Every block of block_size series is drawn with its own generator (see block_rng), so the
+        series do not depend on how the run is split into ranges. In counter mode every series
+        has its own Philox stream (see CounterRNG) and the range is generated directly.
+
+        Parameters
+        ------------
+        start, stop : int
+            Range of series to generate.
+
+        N, T : int
+            Number and length of the time series of the whole run.
+
+        switch : int or ndarray
+            See schedule(). A per-series schedule has one row per series of the whole run.
+
+        seed : int
+            Seed of the run.
+
+        out : ndarray or list
+            Output of stop-start series to write into, see sample().
+
+        block_size : int
+            Number of series per generator.
+
+        cache : dict
+            Blocks that are only partly inside the range are kept here, so that consecutive ranges
+            do not generate them twice.
+
+        counter : bool
+            Use the counter-based generator instead of the per-block ones.
+
+        state : list
+            If given, a (start, stop, generator state, ring buffer) tuple is appended for every block
+            that is generated entirely, so that the run can be continued later (see sample()).
+
+        evidence : Evidence
+            Interventions and observations of the stop-start series, see step(). The range must cover
+            whole blocks.
+
+        variant : ndarray
+            Variant of every series of the whole run when the CPDs are stacked (see stack_cpds), shape (N,).
+
+        Returns
+        ------------
+        ndarray or list
+            out
+        '''
+        if counter:
+            return self._sample_segment(start, stop, T, _switch_rows(switch, start, stop), CounterRNG(seed, start, stop), out,
+                                        state, evidence, _variant_rows(variant, start, stop))
+        if cache is None:
+            cache = {}
+        for block in range(start // block_size, (stop - 1) // block_size + 1):
+            b0, b1 = block * block_size, min((block + 1) * block_size, N)
+            lo, hi = max(start, b0), min(stop, b1)
+            if lo == b0 and hi == b1:
+                self._sample_segment(b0, b1, T, _switch_rows(switch, b0, b1), block_rng(seed, block), _rows(out, b0 - start, b1 - start), state,
+                                     None if evidence is None else evidence.rows(b0 - start, b1 - start), _variant_rows(variant, b0, b1))
+                continue
+            if evidence is not None:
+                raise ValueError("sampling with evidence needs whole blocks of series")
+            if block not in cache:
+                cache.clear()
+                cache[block] = self.sample(b1 - b0, T, _switch_rows(switch, b0, b1), block_rng(seed, block),
+                                           _empty_rows(out, b1 - b0), variant=_variant_rows(variant, b0, b1))
+            if isinstance(out, np.ndarray):
+                out[lo - start:hi - start] = cache[block][lo - b0:hi - b0]
+            else:
+                for col, values in zip(out, cache[block]):
+                    col[lo - start:hi - start] = values[lo - b0:hi - b0]
+        return out
+
+    def _sample_segment(self, start, stop, T, switch, rng, out, state, evidence=None, variant=None):
+        history = self.allocate_history(stop - start)
+        self.sample(stop - start, T, switch, rng, out, history, evidence=evidence, variant=variant)
+        if state is not None:
+            state.append((start, stop, rng_state(rng), history))
+        return out
+
+    def ragged_range(self, start, stop, lengths, switch, seed, out, block_size=BLOCK_SIZE, counter=False):
+        '''
+        Generate the series start..stop-1 of a seeded run of time series of the given lengths, with the generators
+        of sample_range().
+
+        Parameters
+        ------------
+        start, stop : int
+            Range of series to generate. It must cover whole blocks unless counter is True.
+
+        lengths : ndarray
+            Length of every series of the whole run.
+
+        switch, seed, block_size, counter :
+            See sample_range().
+
+        out : ndarray or list
+            Packed output of the series start..stop-1, see sample_ragged().
+
+        Returns
+        ------------
+        ndarray or list
+            out
+        '''
+        if counter:
+            return self.sample_ragged(lengths[start:stop], _switch_rows(switch, start, stop), CounterRNG(seed, start, stop), out)
+        if start % block_size or (stop % block_size and stop != len(lengths)):
+            raise ValueError("sampling ragged series needs whole blocks of series")
+        offsets = ragged_offsets(lengths[start:stop])
+        for b0 in range(start, stop, block_size):
+            b1 = min(b0 + block_size, stop)
+            self.sample_ragged(lengths[b0:b1], _switch_rows(switch, b0, b1), block_rng(seed, b0 // block_size),
+                               _packed_rows(out, offsets, b0 - start, b1 - start))
+        return out
+
+    def generate(self, N, T, switch, seed, out, n_jobs=1, block_size=BLOCK_SIZE, counter=False, state=None, variant=None,
+                 lengths=None):
+        '''
+        Generate a seeded run of N time series, optionally on several processes.
+
+        The blocks of series are shared out between n_jobs worker processes that write into
+        shared memory, so no sample is pickled back. The output is the same for any n_jobs.
+        An output from allocate(shared=True) is written in place, any other one is copied
+        from a shared buffer of the same size at the end.
+
+        Parameters
+        ------------
+        N, T, switch, seed, block_size, counter, state, variant :
+            See sample_range().
+
+        out : ndarray or list
+            Output of the N series to write into, see sample(), or their packed output if lengths is given.
+            It should come from allocate() or allocate_ragged() with shared=True if n_jobs is not 1.
+
+        n_jobs : int
+            Number of worker processes, -1 for one per CPU.
+
+        lengths : ndarray
+            Length of every series, see ragged_range(). T is not used and the run cannot be continued.
+
+        Returns
+        ------------
+        ndarray or list
+            out
+        '''
+        n_blocks = -(-N // block_size)
+        if n_jobs < 0:
+            n_jobs = os.cpu_count()
+        n_jobs = min(n_jobs, n_blocks)
+        if n_jobs <= 1 and lengths is not None:
+            return self.ragged_range(0, N, lengths, switch, seed, out, block_size, counter)
+        if n_jobs <= 1:
+            return self.sample_range(0, N, N, T, switch, seed, out, block_size, counter=counter, state=state, variant=variant)
+
+        # imported here rather than at module level to keep the import of the package light
+        from concurrent.futures import ProcessPoolExecutor
+
+        arrays = [out] if isinstance(out, np.ndarray) else out
+        targets = [col if _shared_buffer(col) is not None else _shared_empty(col.shape, col.dtype) for col in arrays]
+        specs = [(col.dtype.str, col.shape) for col in targets]
+        shards = np.array_split(np.arange(n_blocks), n_jobs)
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_shared,
+                                 initargs=([_shared_buffer(col) for col in targets],)) as pool:
+            futures = [pool.submit(_sample_shard, self, specs, arrays is not out, int(blocks[0]) * block_size,
+                                   min((int(blocks[-1]) + 1) * block_size, N), N, T, switch, seed, block_size, counter,
+                                   state is not None, variant, lengths)
+                       for blocks in shards]
+            for future in futures:
+                segments = future.result()
+                if state is not None:
+                    state.extend(segments)
+        for col, target in zip(arrays, targets):
+            if target is not col:
+                col[...] = target
+        return out
+
+    def log_likelihood(self, data, switch=None, batch_size=BLOCK_SIZE):
+        '''
+        Log-probability of every time point of data under the networks.
+
+        Given the data every factor is known, so each node is evaluated for all the series and all the
+        time points of a network at once; only the series are split into batches to bound memory.
+
+        Parameters
+        ------------
+        data : ndarray or list
+            Samples of shape (N, T, number of nodes), or one (N, T) array per node. Discrete nodes hold
+            their level (1..N_level).
+
+        switch : int
+            See schedule().
+
+        batch_size : int
+            Number of series evaluated together.
+
+        Returns
+        ------------
+        ndarray
+            Array of shape (N, T), the sum over the nodes of log p(value | parents) (log-density for the
+            continuous nodes) at every time point. -inf where a discrete value has probability zero.
+        '''
+        if isinstance(data, np.ndarray):
+            data = [data[:, :, ii] for ii in range(data.shape[2])]
+        N, T = data[0].shape
+        flags = self.schedule(T, switch)
+        if any(np.ndim(flag) != 0 for flag in flags):
+            raise ValueError("log_likelihood needs the same network for all the series at every time point")
+        flags = np.array(flags)
+        out = np.zeros((N, T))
+        for lo in range(0, N, batch_size):
+            columns = [col[lo:lo + batch_size] for col in data]
+            for flag in np.unique(flags):
+                plan, cpds = self.plans[flag], self.cpds[flag]
+                times = np.flatnonzero(flags == flag)
+                for ii in range(self.n_nodes):
+                    cpd = cpds[ii]
+                    entry = cpd.entry([columns[jj][:, times - lag].astype(np.intp)
+                                       for jj, lag in zip(plan.d_parents[ii], plan.d_lags[ii])])
+                    mean = None
+                    if cpd.kind == 'C' and cpd.coef is not None:
+                        params = self._params(cpd, entry)
+                        mean = 0.0
+                        for count, (jj, lag) in enumerate(zip(plan.c_parents[ii], plan.c_lags[ii])):
+                            mean = mean + params[count] * columns[jj][:, times - lag]
+                    out[lo:lo + batch_size, times] += _log_density(cpd, entry, columns[ii][:, times], mean)
+        return out
+
+    def _markov_slices(self, N, flags, rng, history, t0):
+        state = self._markov_state(history, t0)
+        for tt in range(t0, len(flags)):
+            chain = self.markov[flags[tt]]
+            code = chain.step(state, rng.random(N))
+            state = chain.advance(state, code)
+            x = history[tt % self.depth]
+            x[...] = chain.decode[code]
+            yield x
+
+    def _markov_state(self, history, t0):
+        # chain state of the slices t0-1, t0-2, ... (zero before the start of the run)
+        chain = self.markov[0]
+        state = np.zeros(history.shape[1], dtype=np.intp)
+        for lag in range(chain.depth, 0, -1):
+            state *= chain.n_states
+            if t0 - lag >= 0:
+                state += chain.encode(history[(t0 - lag) % self.depth])
+        return state
+
+    def _sample_markov(self, N, flags, rng, columns, array, history, t0, chunk=64):
+        # the joint states are buffered for chunk slices and decoded together, so that every
+        # series is written as one contiguous run instead of a strided write per slice
+        T = len(flags)
+        state = self._markov_state(history, t0)
+        codes = np.empty((max(1, min(chunk, T - t0)), N), dtype=np.intp)
+        for c0 in range(t0, T, chunk):
+            c1 = min(c0 + chunk, T)
+            for tt in range(c0, c1):
+                chain = self.markov[flags[tt]]
+                codes[tt - c0] = code = chain.step(state, rng.random(N))
+                state = chain.advance(state, code)
+            # decode is the same in every network, it only depends on N_level
+            values = chain.decode[codes[:c1 - c0].T]
+            if array is not None:
+                array[:, c0 - t0:c1 - t0] = values
+            else:
+                for ii in range(self.n_nodes):
+                    columns[ii][:, c0 - t0:c1 - t0] = values[:, :, ii]
+            for tt in range(max(c0, c1 - self.depth), c1):
+                history[tt % self.depth] = values[:, tt - c0]
+
+    @staticmethod
+    def _entry(plan, ii, cpd, history, tt, N, variant=None):
+        # history is the ring buffer of slices, the slice of time t is history[t % depth]
+        depth = len(history)
+        entry = cpd.entry([history[(tt - lag) % depth][:, jj].astype(np.intp)
+                           for jj, lag in zip(plan.d_parents[ii], plan.d_lags[ii])], variant)
+        if cpd.noisy is not None:
+            return np.broadcast_to(entry, (N, len(cpd.leak)))
+        return np.broadcast_to(entry, (N,))
+
+    @staticmethod
+    def _params(cpd, entry):
+        # Gaussian parameters of every series in one gather, one row per parameter (scalars when
+        # the node has no discrete parent)
+        if cpd.n_entry == 1:
+            return cpd.params[:, 0]
+        return np.take(cpd.params, entry, axis=1)
+
+    @staticmethod
+    def _mean(plan, ii, history, tt, params):
+        # dot of the coefficients with the lagged continuous parents, read in place from the history
+        depth = len(history)
+        mean = None
+        for count, (jj, lag) in enumerate(zip(plan.c_parents[ii], plan.c_lags[ii])):
+            term = params[count] * history[(tt - lag) % depth][:, jj]
+            if mean is None:
+                mean = term
+            else:
+                mean += term
+        return mean
+
+    @staticmethod
+    def _draw(plan, ii, cpd, history, tt, N, rng, variant=None):
+        entry = BatchSampler._entry(plan, ii, cpd, history, tt, N, variant)
+        if cpd.kind == 'D':
+            u = rng.random(N)
+            if cpd.noisy is not None:
+                # entry is already the cumulative distribution of every series
+                return (entry <= u[:, None]).sum(axis=1) + 1
+            K = cpd.alias.shape[1]
+            if K < ALIAS_MIN_LEVELS:
+                return (cpd.cum[entry] <= u[:, None]).sum(axis=1) + 1
+            u *= K
+            level = np.minimum(u.astype(np.intp), K - 1)
+            return np.where(u - level < cpd.accept[entry, level], level, cpd.alias[entry, level]) + 1
+        # the same draws as rng.normal(loc, scale), i.e. loc + scale * z, without its broadcasting loop
+        params = BatchSampler._params(cpd, entry)
+        if cpd.coef is None:
+            return params[0] + params[1] * rng.standard_normal(N)
+        x = BatchSampler._mean(plan, ii, history, tt, params)
+        x += params[-2] * rng.standard_normal(N)
+        x += params[-1] * rng.standard_normal(N)
+        return x
+
+    @staticmethod
+    def _log_prob(plan, ii, cpd, history, tt, N, values, variant=None):
+        '''
+        Log-probability (log-density for continuous nodes) of the values of node ii at time tt given its parents.
+        '''
+        entry = BatchSampler._entry(plan, ii, cpd, history, tt, N, variant)
+        mean = None
+        if cpd.kind == 'C' and cpd.coef is not None:
+            mean = BatchSampler._mean(plan, ii, history, tt, BatchSampler._params(cpd, entry))
+        return _log_density(cpd, entry, values, mean)
+
+    def _clamp(self, plan, ii, cpd, history, tt, N, x, evidence, variant=None):
+        forced = evidence.at(ii, tt)
+        if forced is None:
+            return
+        mask, values, observed = forced
+        if cpd.kind == 'D':
+            levels = values[mask]
+            if np.any((levels != np.round(levels)) | (levels < 1) | (levels > self.N_level[ii])):
+                raise ValueError("forced values of node %d must be levels between 1 and %d" % (ii, self.N_level[ii]))
+        x[mask, ii] = values[mask]
+        if observed:
+            evidence.log_weight += np.where(mask, self._log_prob(plan, ii, cpd, history, tt, N, x[:, ii], variant), 0.0)
+
+
+def _log_density(cpd, entry, values, mean=None):
+    '''
+    Log-probability (log-density) of values under the CPD entries entry; mean is the weighted sum of the
+    continuous parents of a node that has some.
+    '''
+    if cpd.kind == 'D':
+        with np.errstate(divide='ignore'):
+            return np.log(cpd.level_prob(entry, values))
+    if cpd.coef is None:
+        mean, var = cpd.mu[entry], cpd.sigma[entry] ** 2
+    else:
+        # the intercept and the noise are independent, so the value is Gaussian with both variances
+        var = cpd.sigma_intercept[entry] ** 2 + cpd.sigma[entry] ** 2
+    return -0.5 * (np.log(2 * np.pi * var) + (values - mean) ** 2 / var)
+
+
+# Shared output buffers of a worker process of BatchSampler.generate, see _attach_shared.
+_SHARED = None
+
+
+def _attach_shared(buffers):
+    '''
+    Initializer of the worker processes of BatchSampler.generate. The RawArrays can only be passed on
+    when a process starts, not with its tasks.
+    '''
+    global _SHARED
+    _SHARED = buffers
+
+
+def _sample_shard(sampler, specs, single, start, stop, N, T, switch, seed, block_size, counter, keep_state, variant=None,
+                  lengths=None):
+    '''
+    Worker of BatchSampler.generate: generate the series start..stop-1 into the shared-memory output.
+    It returns the state of the blocks if keep_state is True.
+    '''
+    state = [] if keep_state else None
+    out = [np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+           for buffer, (dtype, shape) in zip(_SHARED, specs)]
+    if lengths is None:
+        out = [col[start:stop] for col in out]
+    else:
+        out = _packed_rows(out, ragged_offsets(lengths), start, stop)
+    if single:
+        out = out[0]
+    if lengths is None:
+        sampler.sample_range(start, stop, N, T, switch, seed, out, block_size, counter=counter, state=state, variant=variant)
+    else:
+        sampler.ragged_range(start, stop, lengths, switch, seed, out, block_size, counter)
+    return state
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+class Evidence:
+    '''
+    Values forced on some nodes while sampling, for scenario generation without rejection.
+
+    An intervention replaces the draw of the node with the given value. An observation does the same
+    and also multiplies the weight of the series by the probability (density) of the value given its
+    parents (likelihood weighting), so that weighted statistics are those of the model conditioned on
+    the observations.
+
+    Parameters
+    -----------
+    N, T : int
+        Number and length of the time series.
+
+    interventions, observations : dict
+        Keyed by node. The values are anything that broadcasts to (N, T): a scalar (every series, every
+        time point), a (T,) array (the same for every series) or a (N, T) array. NaN marks the series and
+        time points that are sampled as usual, e.g. a discrete node forced to level 3 between t=100 and
+        t=200 is np.where((t >= 100) & (t < 200), 3, np.nan) with t=np.arange(T).
+
+    Attributes
+    -----------
+    log_weight : ndarray
+        Log-weight of every series, the sum of the log-probabilities of its observed values.
+    '''
+    def __init__(self, N, T, interventions=None, observations=None, log_weight=None):
+        self.N, self.T = N, T
+        self.clamps = {}
+        for observed, values in ((False, interventions), (True, observations)):
+            for node, value in (values or {}).items():
+                if node in self.clamps:
+                    raise ValueError("node %s is both an intervention and an observation" % node)
+                self.clamps[int(node)] = (np.broadcast_to(np.asarray(value, dtype=float), (N, T)), observed)
+        self.log_weight = np.zeros(N) if log_weight is None else log_weight
+
+    def rows(self, start, stop):
+        '''
+        The evidence of the series start..stop-1. Its log_weight is a view into this one.
+        '''
+        evidence = Evidence(stop - start, self.T, log_weight=self.log_weight[start:stop])
+        evidence.clamps = {node: (values[start:stop], observed) for node, (values, observed) in self.clamps.items()}
+        return evidence
+
+    def at(self, node, tt):
+        '''
+        Forced values of a node at time point tt.
+
+        Returns
+        -----------
+        tuple
+            The mask of the series whose value is forced, the values (NaN where not forced) and whether they
+            are observed, or None if the node is never forced at tt.
+        '''
+        if node not in self.clamps:
+            return None
+        values, observed = self.clamps[node]
+        values = values[:, tt]
+        mask = ~np.isnan(values)
+        if not mask.any():
+            return None
+        return mask, values, observed
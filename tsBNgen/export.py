@@ -0,0 +1,183 @@
+import numpy as np
+
+
+def _columns(data, n_nodes):
+    '''
+    One array per node: (N, T) arrays, or packed (rows,) arrays if the samples are packed.
+    '''
+    if isinstance(data, np.ndarray):
+        return [data[..., ii] for ii in range(n_nodes)]
+    return list(data)
+
+
+def _offsets(columns, offsets):
+    # series of a common length T are packed too, with offsets 0, T, 2T, ...
+    if offsets is not None:
+        return np.asarray(offsets, dtype=np.int64)
+    N, T = columns[0].shape
+    return np.arange(N + 1, dtype=np.int64) * T
+
+
+def _codes(values, n_level):
+    # category codes of the levels 1..n_level, in the smallest signed dtype (-1 is reserved for missing values)
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_level <= np.iinfo(dtype).max:
+            break
+    codes = values.astype(dtype)
+    codes -= 1
+    return codes
+
+
+def series_index(offsets):
+    '''
+    Series and time point of every row of packed samples.
+
+    Parameters
+    -----------
+    offsets : ndarray
+        Offsets of the series, see tsBNgen.engine.ragged_offsets.
+
+    Returns
+    -----------
+    tuple
+        The series (int64) and the time point (int32) of every row, built with np.repeat and np.tile for
+        series of a common length.
+    '''
+    lengths = np.diff(offsets)
+    N = len(lengths)
+    if N and np.all(lengths == lengths[0]):
+        T = int(lengths[0])
+        return np.repeat(np.arange(N, dtype=np.int64), T), np.tile(np.arange(T, dtype=np.int32), N)
+    series = np.repeat(np.arange(N, dtype=np.int64), lengths)
+    time = np.arange(offsets[-1], dtype=np.int64) - np.repeat(offsets[:-1], lengths)
+    return series, time.astype(np.int32)
+
+
+def to_dataframe(data, Node_Type, N_level, offsets=None, layout='long'):
+    '''
+    pandas DataFrame of generated samples.
+
+    The continuous nodes wrap the arrays of the samples without copying them (a DataFrame built from an
+    (N, T, number of nodes) array shares its memory). The discrete nodes become Categorical columns with
+    the categories 1..N_level; only their codes are computed.
+
+    Parameters
+    -----------
+    data : ndarray or list
+        Samples of shape (N, T, number of nodes) or one (N, T) array per node (BN_array or BN_node_arrays),
+        or their packed form (see the lengths of BN_data_gen).
+
+    Node_Type, N_level : list
+        As given to tsBNgen.
+
+    offsets : ndarray
+        Offsets of the series if the samples are packed (BN_offsets).
+
+    layout : string
+        "long" for one row per series and time point, indexed by a (series, time) MultiIndex, with one column
+        per node. "wide" for one row per series, indexed by series, with one column per node and time point
+        ((node, time) MultiIndex); the series must have the same length.
+
+    Returns
+    -----------
+    pandas.DataFrame
+        The columns are named after the index of their node.
+
+    Raises
+    -----------
+    ImportError
+        If pandas is not installed.
+
+    ValueError
+        If layout is not "long" or "wide", or the layout is wide and the series are of different lengths.
+    '''
+    try:
+        import pandas as pd
+    except ImportError:
+        raise ImportError("to_dataframe requires pandas (pip install pandas)")
+    columns = _columns(data, len(Node_Type))
+    if layout == 'long':
+        offsets = _offsets(columns, offsets)
+        series, time = series_index(offsets)
+        index = pd.MultiIndex.from_arrays([series, time], names=['series', 'time'])
+        frame = {}
+        for ii, values in enumerate(columns):
+            values = values.reshape(-1)
+            if Node_Type[ii] == 'D':
+                values = pd.Categorical.from_codes(_codes(values, N_level[ii]), categories=range(1, N_level[ii] + 1),
+                                                   validate=False)
+            frame[ii] = values
+        return pd.DataFrame(frame, index=index, copy=False)
+    if layout != 'wide':
+        raise ValueError("layout must be 'long' or 'wide'")
+    if offsets is not None:
+        raise ValueError("the wide layout needs series of the same length")
+    frame = {}
+    for ii, values in enumerate(columns):
+        if Node_Type[ii] == 'D':
+            codes = _codes(values, N_level[ii])
+            dtype = pd.CategoricalDtype(range(1, N_level[ii] + 1))
+            for tt in range(values.shape[1]):
+                frame[ii, tt] = pd.Categorical.from_codes(codes[:, tt], dtype=dtype, validate=False)
+        else:
+            for tt in range(values.shape[1]):
+                frame[ii, tt] = values[:, tt]
+    frame = pd.DataFrame(frame, index=pd.RangeIndex(len(columns[0]), name='series'), copy=False)
+    frame.columns.names = ['node', 'time']
+    return frame
+
+
+def to_arrow(data, Node_Type, N_level, offsets=None, layout='long'):
+    '''
+    pyarrow Table of generated samples.
+
+    Contiguous arrays (BN_node_arrays of a run with output "nodes", or packed samples) are wrapped without
+    copying them. The discrete nodes become dictionary arrays whose dictionary is the levels 1..N_level.
+
+    Parameters
+    -----------
+    data, Node_Type, N_level, offsets :
+        See to_dataframe.
+
+    layout : string
+        "long" for one row per series and time point, with the columns "series" and "time" followed by one
+        column per node, as written by ParquetSink. "wide" for one row per series, with the column "series"
+        followed by one list column per node, whose offsets are the ones of the series.
+
+    Returns
+    -----------
+    pyarrow.Table
+        The node columns are named after the index of their node.
+
+    Raises
+    -----------
+    ImportError
+        If pyarrow is not installed.
+
+    ValueError
+        If layout is not "long" or "wide".
+    '''
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError("to_arrow requires pyarrow (pip install pyarrow)")
+    if layout not in ('long', 'wide'):
+        raise ValueError("layout must be 'long' or 'wide'")
+    columns = _columns(data, len(Node_Type))
+    offsets = _offsets(columns, offsets)
+    arrays = {}
+    for ii, values in enumerate(columns):
+        values = values.reshape(-1)
+        if Node_Type[ii] == 'D':
+            levels = np.arange(1, N_level[ii] + 1, dtype=np.min_scalar_type(N_level[ii]))
+            values = pa.DictionaryArray.from_arrays(pa.array(_codes(values, N_level[ii])), pa.array(levels))
+        else:
+            values = pa.array(values)
+        arrays[str(ii)] = values
+    if layout == 'long':
+        series, time = series_index(offsets)
+        return pa.table(dict(series=pa.array(series), time=pa.array(time), **arrays))
+    list_array = pa.LargeListArray if offsets[-1] > np.iinfo(np.int32).max else pa.ListArray
+    list_offsets = pa.array(offsets if list_array is pa.LargeListArray else offsets.astype(np.int32))
+    arrays = {name: list_array.from_arrays(list_offsets, values) for name, values in arrays.items()}
+    return pa.table(dict(series=pa.array(np.arange(len(offsets) - 1, dtype=np.int64)), **arrays))
@@ -0,0 +1,150 @@
+import numpy as np
+
+from tsBNgen.cpd import strides
+from tsBNgen.plan import ExecutionPlan
+
+
+def _columns(data):
+    if isinstance(data, np.ndarray):
+        return [data[:, :, ii] for ii in range(data.shape[2])]
+    return [np.asarray(values) for values in data]
+
+
+def _slot_values(columns, parents, lags, times):
+    '''
+    Values of every parent slot at every (series, time point), flattened in the order of the samples.
+    '''
+    return [columns[jj][:, times - lag].ravel() for jj, lag in zip(parents, lags)]
+
+
+def fit_node(ii, plan, Node_Type, N_level, columns, times):
+    '''
+    Estimate the CPD entry of node ii from the time points times of the data.
+
+    Discrete nodes get the frequencies of their levels per parent configuration, counted with np.bincount over
+    the CPD entry of every sample (the mixed-radix code of continous_cpd). Continuous nodes get the mean and
+    standard deviation per entry, or the least-squares coefficients of their continuous parents per entry
+    (normal equations accumulated with np.bincount and solved together). The intercept noise and the noise of a
+    node with continuous parents add up to one Gaussian, so only their total variance can be estimated:
+    sigma_intercept is always 0 and sigma is the standard deviation of the residuals.
+
+    Parameters
+    -----------
+    ii : int
+        The node.
+
+    plan : ExecutionPlan
+        Structure of the network.
+
+    Node_Type, N_level : list
+        As given to tsBNgen.
+
+    columns : list
+        One (N, T) array of samples per node.
+
+    times : ndarray
+        Time points generated with this network.
+
+    Returns
+    -----------
+    list or dict
+        The CPD entry, in the format of the CPD dictionaries.
+    '''
+    levels = plan.d_levels[ii]
+    n_entry = int(np.prod(levels, dtype=np.int64))
+    entry = np.zeros(len(columns[ii]) * len(times), dtype=np.intp)
+    for values, weight in zip(_slot_values(columns, plan.d_parents[ii], plan.d_lags[ii], times), strides(levels)):
+        entry += (values.astype(np.intp) - 1) * weight
+    x = columns[ii][:, times].ravel()
+
+    if Node_Type[ii] == 'D':
+        K = N_level[ii]
+        counts = np.bincount(entry * K + x.astype(np.intp) - 1, minlength=n_entry * K).reshape(n_entry, K).astype(float)
+        total = counts.sum(axis=1, keepdims=True)
+        # configurations that never occur get a uniform distribution
+        prob = np.where(total > 0, counts / np.where(total > 0, total, 1), 1.0 / K)
+        return prob.tolist() if len(plan.parents[ii]) != 0 else prob[0].tolist()
+
+    n = np.bincount(entry, minlength=n_entry).astype(float)
+    seen = n > 0
+    c_values = _slot_values(columns, plan.c_parents[ii], plan.c_lags[ii], times)
+    if len(c_values) == 0:
+        mu = np.bincount(entry, weights=x, minlength=n_entry) / np.where(seen, n, 1)
+        var = np.bincount(entry, weights=(x - mu[entry]) ** 2, minlength=n_entry) / np.where(seen, n, 1)
+        mu = np.where(seen, mu, x.mean() if x.size else 0.0)
+        sigma = np.where(seen, np.sqrt(var), x.std() if x.size else 1.0)
+        cpd = {}
+        for kk in range(n_entry):
+            cpd['mu' + str(kk)] = float(mu[kk])
+            cpd['sigma' + str(kk)] = float(sigma[kk])
+        return cpd
+
+    k = len(c_values)
+    XtX = np.empty((n_entry, k, k))
+    Xty = np.empty((n_entry, k))
+    for a in range(k):
+        Xty[:, a] = np.bincount(entry, weights=c_values[a] * x, minlength=n_entry)
+        for b in range(a, k):
+            XtX[:, a, b] = XtX[:, b, a] = np.bincount(entry, weights=c_values[a] * c_values[b], minlength=n_entry)
+    # pinv keeps configurations with too few samples (singular normal equations) finite
+    coef = np.einsum('eab,eb->ea', np.linalg.pinv(XtX), Xty)
+    residual = x - sum(coef[entry, a] * c_values[a] for a in range(k))
+    sigma = np.sqrt(np.bincount(entry, weights=residual ** 2, minlength=n_entry) / np.where(seen, n, 1))
+    sigma = np.where(seen, sigma, residual.std() if residual.size else 1.0)
+
+    cpd = {}
+    for a, (jj, cc) in enumerate(zip(plan.c_parents[ii], plan.c_coef[ii])):
+        coefficient = cpd.setdefault(str(jj) + str(ii), {'coefficient': []})['coefficient']
+        coefficient.extend([None] * (cc + 1 - len(coefficient)))
+        coefficient[cc] = coef[:, a].tolist()
+    cpd['sigma_intercept'] = [0.0] * n_entry
+    cpd['sigma'] = sigma.tolist()
+    return cpd
+
+
+def fit(data, Mat, Parent, Parent2, loopbacks, Node_Type, N_level, Parent3=None, loopbacks2=None, custom_time=0):
+    '''
+    Estimate the CPD dictionaries of a tsBNgen model from data.
+
+    The structure is taken as given and every network is fitted on the time points it generates: CPD on t=0,
+    CPD2 on the following ones and CPD3 from the switch point of BN_sample_gen_loopback on. The result can be
+    passed to the tsBNgen constructor as it is.
+
+    Parameters
+    -----------
+    data : ndarray or list
+        Samples of shape (N, T, number of nodes), or one (N, T) array per node, e.g. BN_array or BN_node_arrays.
+
+    Mat, Parent, Parent2, loopbacks, Node_Type, N_level, Parent3, loopbacks2, custom_time :
+        As given to tsBNgen.
+
+    Returns
+    -----------
+    tuple
+        CPD and CPD2, and CPD3 if Parent3 is given, keyed by node index (the concatenated string keys of
+        different nodes can be the same). The sigma_intercept of the continuous nodes with continuous parents
+        is 0, all of their variance is in sigma (see fit_node).
+
+    Examples
+    -----------
+    >>> CPD, CPD2 = fit(model.BN_array, Mat, Parent, Parent2, loopbacks, Node_Type, N_level)
+    >>> refit = tsBNgen(T, N, N_level, Mat, Node_Type, CPD, Parent, CPD2, Parent2, loopbacks)
+    '''
+    columns = _columns(data)
+    T = columns[0].shape[1]
+    networks = [(Parent, None), (Parent2, loopbacks)]
+    switch = None
+    if Parent3:
+        networks.append((Parent3, loopbacks2))
+        switch = custom_time if custom_time != 0 else max(sum(loopbacks2.values(), []))
+    t = np.arange(T)
+    flags = np.where(t == 0, 0, 1)
+    if switch is not None:
+        flags[t >= max(switch, 1)] = 2
+
+    CPDs = []
+    for flag, (parents, lags) in enumerate(networks):
+        plan = ExecutionPlan(Mat, Node_Type, N_level, parents, lags)
+        times = t[(flags == flag) & (t >= plan.max_lag)]
+        CPDs.append({ii: fit_node(ii, plan, Node_Type, N_level, columns, times) for ii in range(plan.n_nodes)})
+    return tuple(CPDs)
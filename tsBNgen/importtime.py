@@ -0,0 +1,67 @@
+'''
+Import time of tsBNgen, measured in a fresh interpreter with python -X importtime.
+
+    python -m tsBNgen.importtime [budget in ms]
+
+exits with status 1 if importing tsBNgen.tsBNgen takes longer than the budget, numpy excluded, or if it
+imports pandas.
+'''
+import subprocess
+import sys
+
+# milliseconds for tsBNgen's own modules and the standard library modules they pull in, numpy excluded
+IMPORT_BUDGET_MS = 50
+
+
+def measure(module='tsBNgen.tsBNgen'):
+    '''
+    Import a module in a fresh interpreter.
+
+    Parameters
+    -----------
+    module : string
+        Module to import.
+
+    Returns
+    -----------
+    dict
+        Cumulative import time in milliseconds of every top-level module imported along the way (e.g.
+        'numpy', 'tsBNgen.engine') and of the module itself under 'total'.
+    '''
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            capture_output=True, text=True, check=True)
+    # the lines are "import time: self [us] | cumulative | name", children are listed before their parent
+    times = {}
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if not line.startswith('import time:') or len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        if '.' not in stripped or stripped.startswith('tsBNgen'):
+            times[stripped] = times.get(stripped, 0.0) + int(fields[1]) / 1000.0
+        if stripped == module and len(name) - len(stripped) == 1:
+            times['total'] = int(fields[1]) / 1000.0
+    return times
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    budget = float(argv[0]) if argv else IMPORT_BUDGET_MS
+    times = measure()
+    own = times['total'] - times.get('numpy', 0.0)
+    print("import tsBNgen.tsBNgen: %.1f ms, %.1f ms without numpy (budget %.0f ms)" % (times['total'], own, budget))
+    for name in sorted((name for name in times if name.startswith('tsBNgen.')), key=times.get, reverse=True):
+        print("  %-30s %8.1f ms" % (name, times[name]))
+    failed = False
+    if 'pandas' in times:
+        print("pandas is imported by the core")
+        failed = True
+    if own > budget:
+        print("over budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
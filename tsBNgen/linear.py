@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class LinearGaussian:
+    '''
+    VAR(p) form of a network whose nodes are all continuous.
+
+    Every node is a weighted sum of (lagged) parents plus Gaussian noise, so a time slice of all
+    the nodes is
+
+        x(t) = c + S z(t) + M[0] x(t-1) + ... + M[p-1] x(t-p),   z(t) ~ N(0, I)
+
+    where the edges inside the slice are folded in with (I - A0)^-1. The intercept and the noise
+    of a node are merged into one Gaussian with variance sigma_intercept^2 + sigma^2.
+
+    Parameters
+    -----------
+    plan : ExecutionPlan
+        Structure of the network.
+
+    cpds : list
+        NodeCPD of every node.
+
+    Attributes
+    -----------
+    c : ndarray
+        Mean of a slice whose lagged values are all zero, shape (nodes,).
+
+    S : ndarray
+        Noise loading, shape (nodes, nodes).
+
+    M : ndarray
+        Lag matrices, shape (max_lag, nodes, nodes).
+
+    max_lag : int
+        Order p of the VAR.
+    '''
+    def __init__(self, plan, cpds):
+        n = plan.n_nodes
+        A = np.zeros((plan.max_lag + 1, n, n))
+        b = np.zeros(n)
+        std = np.zeros(n)
+        for ii in range(n):
+            cpd = cpds[ii]
+            if cpd.coef is None:
+                b[ii] = cpd.mu[0]
+                std[ii] = cpd.sigma[0]
+                continue
+            std[ii] = np.hypot(cpd.sigma_intercept[0], cpd.sigma[0])
+            for count, (jj, lag) in enumerate(zip(plan.c_parents[ii], plan.c_lags[ii])):
+                A[lag, ii, jj] += cpd.coef[count, 0]
+        # A[0] is strictly lower triangular in topological order, so I - A[0] is always invertible
+        B = np.linalg.inv(np.eye(n) - A[0])
+        self.c = B @ b
+        self.S = B * std
+        self.M = B @ A[1:]
+        self.max_lag = plan.max_lag
+
+    def step(self, z, history, out=None, exact=False):
+        '''
+        Compute one time slice of all the series.
+
+        Parameters
+        -----------
+        z : ndarray
+            Standard normal noise, shape (N, nodes).
+
+        history : list
+            The previous slices x(t-1), ..., x(t-max_lag), each of shape (N, nodes).
+
+        out : ndarray
+            Array of shape (N, nodes) to write the slice into.
+
+        exact : bool
+            Sum the products node by node with elementwise operations instead of matrix products, whose
+            rounding depends on how BLAS splits the rows. A series then gets the same values whatever the
+            other series of the batch.
+
+        Returns
+        -----------
+        ndarray
+            x(t), shape (N, nodes).
+        '''
+        if not exact:
+            out = np.matmul(z, self.S.T, out=out)
+            out += self.c
+            for M, x in zip(self.M, history):
+                out += x @ M.T
+            return out
+        if out is None:
+            out = np.empty_like(z)
+        out[...] = self.c
+        for A, x in zip([self.S] + list(self.M), [z] + list(history)):
+            for jj in np.flatnonzero(A.any(axis=0)):
+                out += x[:, jj, None] * A[:, jj]
+        return out
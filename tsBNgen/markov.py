@@ -0,0 +1,128 @@
+import numpy as np
+
+from tsBNgen.cpd import strides
+
+
+class JointMarkovChain:
+    '''
+    Joint-state form of a network whose nodes are all discrete.
+
+    A time slice of all the nodes is one joint state (a mixed-radix code over the node levels) and
+    the state of the chain is the last depth slices. The transition of the whole slice is a single
+    categorical draw over the joint states, taken from a precomputed table.
+
+    Parameters
+    -----------
+    plan : ExecutionPlan
+        Structure of the network.
+
+    cpds : list
+        NodeCPD of every node.
+
+    levels : list
+        Number of levels of every node.
+
+    depth : int
+        Number of past slices kept in the chain state, at least plan.max_lag.
+
+    Attributes
+    -----------
+    n_states : int
+        Number of joint states of a slice (product of levels).
+
+    n_rows : int
+        Number of chain states, n_states**depth.
+
+    decode : ndarray
+        Level of every node in every joint state, shape (n_states, nodes).
+
+    cum : ndarray
+        Cumulative transition probabilities, flattened from shape (n_rows, n_states). The last one of
+        every row is inf so that a search always stops in its row.
+
+    guide : ndarray
+        Guide table of cum (cutpoint method, Chen and Asau 1974), flattened from shape (n_rows, n_states):
+        the number of joint states of the row whose cumulative probability is at most j/n_states. The next
+        slice of every series is drawn with one uniform, a lookup and on average about one comparison,
+        and both tables are built in O(n_rows x n_states).
+    '''
+    def __init__(self, plan, cpds, levels, depth):
+        n = plan.n_nodes
+        self.n_states = S = int(np.prod(levels, dtype=np.int64))
+        self.depth = depth
+        self.n_rows = R = S ** depth
+        self.strides = strides(levels)
+        codes = np.arange(S)
+        self.decode = np.empty((S, n), dtype=np.intp)
+        for ii in range(n - 1, -1, -1):
+            self.decode[:, ii] = codes % levels[ii] + 1
+            codes = codes // levels[ii]
+
+        rows = np.arange(R)[:, None]
+        cols = np.arange(S)[None, :]
+
+        def value(jj, lag):
+            if lag == 0:
+                return self.decode[cols, jj]
+            return self.decode[(rows // S ** (lag - 1)) % S, jj]
+
+        prob = np.ones((R, S))
+        for ii in range(n):
+            cpd = cpds[ii]
+            entry = cpd.entry([value(jj, lag) for jj, lag in zip(plan.d_parents[ii], plan.d_lags[ii])])
+            prob *= cpd.level_prob(entry, self.decode[cols, ii])
+        cum = np.cumsum(prob, axis=1, out=prob)
+        cum[:, -1] = np.inf
+        # state k is counted from the cell floor(cum*S)+1 on, i.e. the first cell j with j/S >= cum
+        cell = np.minimum(np.floor(cum[:, :-1] * S), S - 1).astype(np.intp) + 1
+        cell += rows * (S + 1)
+        counts = np.bincount(cell.ravel(), minlength=R * (S + 1)).reshape(R, S + 1)[:, :S]
+        self.guide = np.cumsum(counts, axis=1).ravel()
+        self.cum = cum.ravel()
+
+    def step(self, state, u):
+        '''
+        Draw the next slice of every series.
+
+        Parameters
+        -----------
+        state : ndarray
+            Chain state of every series: sum of the joint states of slices t-1, t-2, ... weighted
+            by 1, n_states, n_states**2, ...
+
+        u : ndarray
+            One uniform draw per series.
+
+        Returns
+        -----------
+        ndarray
+            Joint state of the new slice of every series.
+        '''
+        # the first joint state of the row whose cumulative probability is above u, searched from the guide
+        row = state * self.n_states
+        cell = (u * self.n_states).astype(np.intp)
+        np.minimum(cell, self.n_states - 1, out=cell)
+        code = self.guide[row + cell]
+        row += code
+        # only the few series whose cell holds several joint states go on searching
+        more = np.flatnonzero(self.cum[row] <= u)
+        while len(more):
+            code[more] += 1
+            row[more] += 1
+            more = more[self.cum[row[more]] <= u[more]]
+        return code
+
+    def encode(self, values):
+        '''
+        Joint state of slices given as the level of every node, shape (N, nodes).
+        '''
+        return (np.asarray(values).astype(np.intp) - 1) @ self.strides
+
+    def advance(self, state, code):
+        '''
+        Chain state after appending the slice code.
+        '''
+        state = state * self.n_states
+        state += code
+        state %= self.n_rows
+        return state
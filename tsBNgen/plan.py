@@ -0,0 +1,292 @@
+import numpy as np
+
+
+def _frozen(values, dtype=np.intp):
+    array = np.array(values, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+
+def edge_lags(loopbacks, jj, ii):
+    '''
+    Loopbacks of the edge from node jj to node ii.
+
+    Parameters
+    -----------
+    loopbacks : dict
+        Keyed either by (parent, child) tuples or by the concatenated strings str(parent)+str(child).
+        The tuple form is unambiguous for networks with more than ten nodes ("1"+"12" vs "11"+"2").
+
+    jj, ii : int
+        Parent and child.
+
+    Returns
+    -----------
+    list
+        The lags of the edge, or None if the edge has no loopback.
+    '''
+    if loopbacks is None:
+        return None
+    if (jj, ii) in loopbacks:
+        return loopbacks[(jj, ii)]
+    return loopbacks.get(str(jj) + str(ii))
+
+
+def adjacency_csr(Mat, n_nodes):
+    '''
+    Compressed sparse row (CSR) form of the adjacency of a network: the children of node ii are
+    indices[indptr[ii]:indptr[ii+1]], in increasing order.
+
+    Only the edges are stored, so networks with thousands of nodes can be given as an edge list or a
+    scipy.sparse matrix without ever building the dense matrix.
+
+    Parameters
+    -----------
+    Mat : ndarray, data-frame, list or sparse matrix
+        A square (n_nodes, n_nodes) adjacency matrix, Mat[parent, child] != 0 for every edge (a pandas
+        data-frame, nested lists or a scipy.sparse matrix work as well), or a list of (parent, child) pairs.
+
+    n_nodes : int
+        Number of nodes.
+
+    Returns
+    -----------
+    tuple
+        indptr, of length n_nodes+1, and indices, of length the number of edges.
+
+    Raises
+    -----------
+    ValueError
+        If Mat is neither a (n_nodes, n_nodes) matrix nor a list of edges between the n_nodes nodes.
+    '''
+    if hasattr(Mat, 'tocoo'):
+        # scipy.sparse, without importing scipy
+        if Mat.shape != (n_nodes, n_nodes):
+            raise ValueError("Mat should be a (%d, %d) adjacency matrix" % (n_nodes, n_nodes))
+        coo = Mat.tocoo()
+        keep = coo.data != 0
+        parent, child = coo.row[keep], coo.col[keep]
+    else:
+        array = np.asarray(Mat)
+        # a square matrix wins over an edge list of the same shape (two nodes, two edges)
+        if array.shape == (n_nodes, n_nodes):
+            parent, child = np.nonzero(array)
+        elif array.size == 0:
+            parent = child = np.zeros(0, dtype=np.intp)
+        elif array.ndim == 2 and array.shape[1] == 2:
+            parent, child = array[:, 0], array[:, 1]
+        else:
+            raise ValueError("Mat should be a (%d, %d) adjacency matrix or a list of (parent, child) pairs" % (n_nodes, n_nodes))
+    parent = np.asarray(parent, dtype=np.intp)
+    child = np.asarray(child, dtype=np.intp)
+    if parent.size and (min(parent.min(), child.min()) < 0 or max(parent.max(), child.max()) >= n_nodes):
+        raise ValueError("Mat has edges between nodes outside 0..%d" % (n_nodes - 1))
+    # sorted by parent then child, repeated edges counted once
+    code = np.unique(parent * n_nodes + child)
+    indptr = np.zeros(n_nodes + 1, dtype=np.intp)
+    np.cumsum(np.bincount(code // n_nodes, minlength=n_nodes), out=indptr[1:])
+    return indptr, code % n_nodes
+
+
+def topological_order(indptr, indices):
+    '''
+    Topological ordering of the graph (Kahn's algorithm), roots first.
+
+    The queue is processed a generation at a time: the children of all the nodes of the current
+    generation are gathered and their in-degrees decremented at once, and a node joins the queue when
+    its last parent is processed. The order is the one of the usual first-in first-out Kahn's
+    algorithm, in O(nodes + edges).
+
+    Parameters
+    -----------
+    indptr, indices : ndarray
+        Adjacency in CSR form, see adjacency_csr.
+
+    Returns
+    -----------
+    list
+        The nodes in topological order.
+
+    Raises
+    -----------
+    ValueError
+        "DAG has a cycle"
+    '''
+    n_nodes = len(indptr) - 1
+    counts = np.diff(indptr)
+    in_degree = np.bincount(indices, minlength=n_nodes)
+    generation = np.flatnonzero(in_degree == 0)
+    order = [generation]
+    while len(generation):
+        # children of the generation, in queue order
+        lengths = counts[generation]
+        shift = np.repeat(indptr[generation] - (np.cumsum(lengths) - lengths), lengths)
+        children = indices[shift + np.arange(len(shift))]
+        np.subtract.at(in_degree, children, 1)
+        ready = in_degree[children] == 0
+        # a child that is ready joins at its last occurrence, i.e. when its last parent is processed
+        last = np.zeros(len(children), dtype=bool)
+        last[len(children) - 1 - np.unique(children[::-1], return_index=True)[1]] = True
+        generation = children[ready & last]
+        order.append(generation)
+    order = np.concatenate(order).tolist()
+    if len(order) != n_nodes:
+        raise ValueError("DAG has a cycle")
+    return order
+
+
+class ExecutionPlan:
+    '''
+    Frozen structure of one network (Parent/Parent2/Parent3 with its loopbacks).
+
+    All the arrays are read-only; tsBNgen builds a new plan whenever Mat, Node_Type, N_level,
+    a Parent dictionary or a loopbacks dictionary is reassigned.
+
+    Attributes
+    -----------
+    n_nodes : int
+        Number of nodes.
+
+    top_order : ndarray
+        Topological order of the nodes.
+
+    position : ndarray
+        Position of every node in top_order.
+
+    indptr, indices : ndarray
+        The adjacency matrix in CSR form, see adjacency_csr. The dense matrix is never built.
+
+    is_root : ndarray
+        True for the nodes without parent in the adjacency matrix.
+
+    in_degree : ndarray
+        Number of parents of every node in the adjacency matrix.
+
+    children : tuple
+        Children of every node in the adjacency matrix.
+
+    parents : tuple
+        Parent list of every node, as given in the Parent dictionary.
+
+    keys : tuple
+        String key of every node in the CPD dictionary, i.e. its parents and itself concatenated. Different
+        nodes can share it (node 2 with parent 11 and node 12 with parent 1 are both "112"), see cpd_key.
+
+    d_parents, d_lags : tuple
+        Per node, the discrete parent of every parent slot and the lag at which it is read.
+
+    c_parents, c_lags, c_coef : tuple
+        Per node, the continuous parent of every parent slot, the lag at which it is read and the
+        position of its coefficient in the 'coefficient' list of the CPD.
+
+    d_levels : tuple
+        Per node, the number of levels of every discrete parent slot.
+
+    d_offsets, c_offsets : tuple
+        Per node, where the parent slot is read in a per-node history list, i.e. Node[parent][-offset],
+        while the nodes of the current slice are sampled in topological order.
+
+    max_lag : int
+        Largest lag of the network.
+    '''
+    def __init__(self, adjacency, Node_Type, N_level, Parent, loopbacks=None):
+        self.n_nodes = len(Node_Type)
+        indptr, indices = adjacency_csr(adjacency, self.n_nodes)
+        order = topological_order(indptr, indices)
+        position = np.empty(self.n_nodes, dtype=np.intp)
+        position[order] = np.arange(self.n_nodes)
+        self.top_order = _frozen(order)
+        self.position = _frozen(position)
+        self.indptr = _frozen(indptr)
+        self.indices = _frozen(indices)
+        self.in_degree = _frozen(np.bincount(indices, minlength=self.n_nodes))
+        self.is_root = _frozen(self.in_degree == 0, dtype=bool)
+        self.children = tuple(self.indices[indptr[ii]:indptr[ii + 1]] for ii in range(self.n_nodes))
+        self.parents = tuple(tuple(Parent[str(ii)]) for ii in range(self.n_nodes))
+        self.keys = tuple(''.join(str(jj) for jj in self.parents[ii]) + str(ii) for ii in range(self.n_nodes))
+        shared = {}
+        for ii, key in enumerate(self.keys):
+            shared.setdefault(key, []).append(ii)
+        self._shared = {key: nodes for key, nodes in shared.items() if len(nodes) > 1}
+
+        d_parents, d_lags, d_offsets = [], [], []
+        c_parents, c_lags, c_coef, c_offsets = [], [], [], []
+        for ii in range(self.n_nodes):
+            slots = self._slots(ii, position, loopbacks)
+            if Node_Type[ii] == 'D' and any(Node_Type[jj] == 'C' for jj in self.parents[ii]):
+                raise Exception("Parent of a discrete node cannot be continuous")
+            d_slots = [s for s in slots if Node_Type[s[0]] == 'D']
+            c_slots = [s for s in slots if Node_Type[s[0]] == 'C']
+            d_parents.append(_frozen([s[0] for s in d_slots]))
+            d_lags.append(_frozen([s[1] for s in d_slots]))
+            d_offsets.append(_frozen([s[1] + (position[s[0]] < position[ii]) for s in d_slots]))
+            c_parents.append(_frozen([s[0] for s in c_slots]))
+            c_lags.append(_frozen([s[1] for s in c_slots]))
+            c_coef.append(_frozen([s[2] for s in c_slots]))
+            c_offsets.append(_frozen([s[1] + (position[s[0]] < position[ii]) for s in c_slots]))
+        self.d_parents, self.d_lags, self.d_offsets = tuple(d_parents), tuple(d_lags), tuple(d_offsets)
+        self.c_parents, self.c_lags, self.c_offsets = tuple(c_parents), tuple(c_lags), tuple(c_offsets)
+        self.c_coef = tuple(c_coef)
+        self.d_levels = tuple(tuple(N_level[jj] for jj in parents) for parents in self.d_parents)
+        self.max_lag = max([int(lags.max(initial=0)) for lags in self.d_lags + self.c_lags] + [0])
+
+    def cpd_key(self, CPD, ii):
+        '''
+        Key of node ii in a CPD dictionary.
+
+        The node itself (int) and the (tuple of parents, node) tuple are unambiguous and looked up first, the
+        concatenated string keys[ii] is the fallback. A string key shared with another node that is not keyed
+        unambiguously either cannot tell the two nodes apart.
+
+        Parameters
+        -----------
+        CPD : dict
+            CPD, CPD2 or CPD3.
+
+        ii : int
+            The node.
+
+        Returns
+        -----------
+        int, tuple or string
+
+        Raises
+        -----------
+        KeyError
+            If the CPD of the node is missing.
+
+        ValueError
+            If the CPD of the node is only found under a string key shared with another node.
+        '''
+        for key in (ii, (self.parents[ii], ii)):
+            if key in CPD:
+                return key
+        key = self.keys[ii]
+        if key not in CPD:
+            raise KeyError(key)
+        for jj in self._shared.get(key, ()):
+            if jj != ii and jj not in CPD and (self.parents[jj], jj) not in CPD:
+                raise ValueError("CPD key %r is shared by the nodes %s, key their CPDs by node index instead"
+                                 % (key, self._shared[key]))
+        return key
+
+    def _slots(self, ii, position, loopbacks):
+        '''
+        Expand the parent list of node ii into (parent, lag, coefficient index) slots.
+
+        The first occurrence of a parent with a loopback contributes one slot per lag, any further
+        occurrence reads the parent in the current time slice. Coefficients of lagged parents that
+        come later in the topological order (e.g. the node itself) are indexed from lag-1.
+        '''
+        slots = []
+        used = set()
+        for jj in self.parents[ii]:
+            lags = edge_lags(loopbacks, jj, ii)
+            if lags is not None and jj not in used:
+                used.add(jj)
+                for mm in lags:
+                    slots.append((jj, mm, mm if position[jj] < position[ii] else mm - 1))
+            elif jj != ii:
+                # a parent that has not been drawn yet in this slice is read from the previous one
+                slots.append((jj, 0 if position[jj] < position[ii] else 1, 0))
+        return slots
@@ -0,0 +1,147 @@
+import time
+
+import numpy as np
+
+from tsBNgen.engine import BatchSampler, BLOCK_SIZE, block_rng
+
+
+class Simulator:
+    '''
+    Advance all N time series of a model by one time step at a time, e.g. to feed a live pipeline.
+
+    Time point 0 follows Initial_sample, the next ones BN_sample, or BN_sample_loopback from the switch
+    point on if loopback is True. Only the last max(loopback)+1 slices are kept, so the series can run
+    for any number of steps. With a seed, the slices are exactly the time points of BN_data_gen (or
+    BN_sample_gen_loopback) with the same seed and block_size.
+
+    Parameters
+    -----------
+    model : tsBNgen
+        The model to simulate. model.N is the number of series; model.T is not used.
+
+    seed : int
+        Seed of the run. If None the generator is seeded from the global numpy state.
+
+    loopback : bool
+        Use CPD3/Parent3/loopbacks2 from the switch point on, as BN_sample_gen_loopback does.
+
+    dtype : dtype
+        dtype of the returned slice.
+
+    block_size : int
+        See BN_data_gen.
+
+    window : int
+        Number of recent steps kept for the latency report.
+
+    Attributes
+    -----------
+    t : int
+        Time point of the next step.
+
+    out : ndarray
+        The preallocated (N, number of nodes) slice that step() fills and returns.
+
+    Methods
+    ------------
+    step()
+        Generate the next time point of every series.
+
+    latency()
+        Latency report of the recent steps.
+
+    stream(rate=None, steps=None)
+        Asynchronous iterator over the next time points.
+    '''
+    def __init__(self, model, seed=None, loopback=False, dtype=np.float64, block_size=BLOCK_SIZE, window=1000):
+        self.sampler = BatchSampler(model)
+        self.N = model.N
+        self.switch = model._loopback_switch() if loopback else None
+        if seed is None:
+            self.segments = [(0, self.N, np.random.default_rng(np.random.randint(np.iinfo(np.int32).max)))]
+        else:
+            self.segments = [(start, min(start + block_size, self.N), block_rng(seed, start // block_size))
+                             for start in range(0, self.N, block_size)]
+        self.history = self.sampler.allocate_history(self.N)
+        self.out = np.empty((self.N, self.sampler.n_nodes), dtype=dtype)
+        self.t = 0
+        self._latency = np.zeros(window)
+        self._steps = 0
+        self._late = 0
+
+    def step(self):
+        '''
+        Generate the next time point of every series.
+
+        Returns
+        -----------
+        ndarray
+            out, the (N, number of nodes) slice of time point t. It is overwritten by the next step; copy it to keep it.
+        '''
+        start = time.perf_counter()
+        flag = self.sampler.network(self.t, self.switch)
+        for s0, s1, rng in self.segments:
+            self.sampler.step(s1 - s0, self.t, flag, rng, self.history[:, s0:s1])
+        self.out[...] = self.history[self.t % self.sampler.depth]
+        self.t += 1
+        self._latency[self._steps % len(self._latency)] = time.perf_counter() - start
+        self._steps += 1
+        return self.out
+
+    def latency(self):
+        '''
+        Latency report of the recent steps.
+
+        Returns
+        -----------
+        dict
+            steps (total number of steps), last, mean, p50, p99 and max (seconds per step over the last window
+            steps) and late (number of steps stream() could not deliver on time).
+        '''
+        recent = self._latency[:min(self._steps, len(self._latency))]
+        if len(recent) == 0:
+            return {'steps': 0, 'late': self._late}
+        return {'steps': self._steps, 'last': float(self._latency[(self._steps - 1) % len(self._latency)]),
+                'mean': float(recent.mean()), 'p50': float(np.percentile(recent, 50)),
+                'p99': float(np.percentile(recent, 99)), 'max': float(recent.max()), 'late': self._late}
+
+    async def stream(self, rate=None, steps=None):
+        '''
+        Asynchronous iterator over the next time points, for use with "async for".
+
+        The next step is only computed once the consumer asks for it, so a slow consumer slows the
+        simulation down instead of letting slices pile up. Steps run in the default executor so that
+        the event loop stays responsive.
+
+        Parameters
+        -----------
+        rate : float
+            Target number of steps per second. None generates them as fast as they are consumed. A step
+            that is due while the previous one is still running is delivered late (counted in latency())
+            and the schedule restarts from it rather than bursting to catch up.
+
+        steps : int
+            Number of steps to generate. None runs until the consumer stops iterating.
+
+        Yields
+        -----------
+        ndarray
+            out after each step, see step().
+        '''
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        period = None if rate is None else 1.0 / rate
+        due = loop.time()
+        count = 0
+        while steps is None or count < steps:
+            if period is not None:
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                elif count > 0 and wait < -period:
+                    self._late += 1
+                    due = loop.time()
+                due += period
+            yield await loop.run_in_executor(None, self.step)
+            count += 1
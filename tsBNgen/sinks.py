@@ -0,0 +1,141 @@
+import numpy as np
+
+
+class NpySink:
+    '''
+    Write the generated samples into a memory-mapped .npy file of shape (N, T, number of nodes).
+
+    The file is preallocated when the run starts and every batch is copied into its rows, so the
+    dataset never has to fit in memory. Load it with np.load(path, mmap_mode='r').
+
+    Parameters
+    -----------
+    path : string
+        Path of the .npy file.
+
+    dtype : dtype
+        dtype of the array. By default the smallest dtype that holds all the nodes, e.g. uint8 for a
+        network whose nodes are all discrete with few levels and the continuous dtype otherwise.
+    '''
+    def __init__(self, path, dtype=None):
+        self.path = path
+        self.dtype = dtype
+        self.array = None
+
+    def open(self, N, T, dtypes):
+        '''
+        Create the file for N time series of length T with one column per node of the given dtypes.
+        '''
+        dtype = self.dtype if self.dtype is not None else np.result_type(*dtypes)
+        self.array = np.lib.format.open_memmap(self.path, mode='w+', dtype=dtype, shape=(N, T, len(dtypes)))
+
+    def write(self, start, columns):
+        '''
+        Write the series start..start+n-1, given as one (n, T) array per node.
+        '''
+        self.array[start:start + len(columns[0])] = np.stack(columns, axis=2)
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+            self.array = None
+
+
+class ParquetSink:
+    '''
+    Write the generated samples into a Parquet file, one row group per batch.
+
+    The table is in long format with one row per series and time point: the columns "series" and
+    "time" followed by one column per node named after its index. Discrete nodes are stored as the
+    smallest unsigned integer type that holds their levels. Requires pyarrow.
+
+    Parameters
+    -----------
+    path : string
+        Path of the Parquet file.
+
+    compression : string
+        Compression codec passed to pyarrow.parquet.ParquetWriter.
+    '''
+    def __init__(self, path, compression='snappy'):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("ParquetSink requires pyarrow (pip install pyarrow)")
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.path = path
+        self.compression = compression
+        self.writer = None
+        self.T = None
+
+    def open(self, N, T, dtypes):
+        pa = self._pa
+        fields = [pa.field('series', pa.int64()), pa.field('time', pa.int32())]
+        fields += [pa.field(str(ii), pa.from_numpy_dtype(dtype)) for ii, dtype in enumerate(dtypes)]
+        self.schema = pa.schema(fields)
+        self.T = T
+        self.writer = self._pq.ParquetWriter(self.path, self.schema, compression=self.compression)
+
+    def write(self, start, columns):
+        n = len(columns[0])
+        arrays = [np.repeat(np.arange(start, start + n, dtype=np.int64), self.T),
+                  np.tile(np.arange(self.T, dtype=np.int32), n)]
+        arrays += [col.ravel() for col in columns]
+        self.writer.write_table(self._pa.Table.from_arrays([self._pa.array(a) for a in arrays], schema=self.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class HDF5Sink:
+    '''
+    Write the generated samples into an HDF5 dataset of shape (N, T, number of nodes). Requires h5py.
+
+    Parameters
+    -----------
+    path : string
+        Path of the HDF5 file. It is opened in append mode so several datasets can share a file.
+
+    dataset : string
+        Name of the dataset.
+
+    dtype : dtype
+        See NpySink.
+
+    compression : string
+        Compression filter of the dataset, e.g. "gzip". None stores it uncompressed.
+    '''
+    def __init__(self, path, dataset='BN_array', dtype=None, compression=None):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("HDF5Sink requires h5py (pip install h5py)")
+        self._h5py = h5py
+        self.path = path
+        self.dataset = dataset
+        self.dtype = dtype
+        self.compression = compression
+        self.file = None
+
+    def open(self, N, T, dtypes):
+        dtype = self.dtype if self.dtype is not None else np.result_type(*dtypes)
+        self.file = self._h5py.File(self.path, 'a')
+        if self.dataset in self.file:
+            del self.file[self.dataset]
+        # chunks of whole series of about 2**17 samples
+        rows = max(1, min(N, (1 << 17) // max(1, T * len(dtypes))))
+        self.array = self.file.create_dataset(self.dataset, shape=(N, T, len(dtypes)), dtype=dtype,
+                                              chunks=(rows, T, len(dtypes)), compression=self.compression)
+
+    def write(self, start, columns):
+        self.array[start:start + len(columns[0])] = np.stack(columns, axis=2)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            self.array = None
@@ -1,6 +1,27 @@
-from tsBNgen import *
+import json
+
+import numpy as np
+
+from tsBNgen.engine import BatchSampler, BLOCK_SIZE, MAX_JOINT_ENTRIES, block_rng, rng_state, restore_rng, _rows
+from tsBNgen.cpd import strides, compile_cpd, compile_node, edge_entry, stack_cpds
+from tsBNgen.evidence import Evidence
+from tsBNgen.linear import LinearGaussian
+from tsBNgen.markov import JointMarkovChain
+from tsBNgen import export
+from tsBNgen.plan import ExecutionPlan
+from tsBNgen.simulator import Simulator
+
+
+def _cpd_key(CPD,index1):
+    # keys resolved by ExecutionPlan.cpd_key are used as they are, anything else as in the string format
+    return index1 if index1 in CPD else str(index1)
+
+
 class tsBNgen:
-    def __init__(self,T,N,N_level,Mat,Node_Type,CPD,Parent,CPD2,Parent2,loopbacks,CPD3=None,Parent3=None,loopbacks2=None,custom_time=0):
+    _STRUCTURE=('Mat','Node_Type','N_level','Parent','Parent2','Parent3','loopbacks','loopbacks2')
+    _PARAMETERS=('CPD','CPD2','CPD3')
+
+    def __init__(self,T,N,N_level,Mat,Node_Type,CPD,Parent,CPD2,Parent2,loopbacks,CPD3=None,Parent3=None,loopbacks2=None,custom_time=0,max_joint_entries=MAX_JOINT_ENTRIES):
         '''
         A class to generate time series according to arbitrary dynamic Bayesian network structure.
 
@@ -15,14 +36,20 @@ class tsBNgen:
         N_level : list
             Number of levels for the discrete nodes. Ignore this for the continuous nodes.
 
-        Mat : data-frame
-            Adjacency matrix corresponding to the Bayesian network at initial time.
+        Mat : ndarray, data-frame or list
+            Adjacency matrix corresponding to the Bayesian network at initial time, Mat[parent, child] != 0 for
+            every edge, or the list of its (parent, child) edges. pandas is not required, and a scipy.sparse
+            matrix or an edge list keeps large networks from ever being stored densely.
 
         Node_Type : list
             Identifying nodes as either discrete "D" or continuous "C".
 
         CPD : dict
-            Probability distribution fof the nodes at initial time point.
+            Probability distribution fof the nodes at initial time point. The rows of a discrete node can be 
+            replaced by a compact CPD (NoisyOR, NoisyMAX, RuleCPD or SparseCPD of tsBNgen.compact), in CPD2 
+            and CPD3 as well. An entry is keyed by the concatenated parents and node ("012" for node 2 with 
+            parents 0 and 1), by the node (2) or by the tuple of its parents and the node (((0, 1), 2)); the 
+            string keys of large networks can collide, the other two cannot.
 
         Parent : dict
             Parents of each node at initial time point.
@@ -51,6 +78,10 @@ class tsBNgen:
         custom_time: int
             Determines at which time point, the new BN is used. The default is 0, which means
             the program learns it automatically from the loopbacks entry. 
+
+        max_joint_entries : int
+            If all the nodes are discrete, the batched sampler compiles the network to a Markov chain over 
+            the joint states when its transition table has at most this many entries. 0 disables it.
             
         Methods
         ------------
@@ -103,6 +134,75 @@ class tsBNgen:
         BN_sample_gen_loopback()
             custom_time is not specified and you want the loopback value for some nodes to be at most 2.
                 custom_time is specified and it is at least equal to the maximum loopback value of the loopbacks2.
+
+        array_to_nodes(array)
+            Convert generated samples to the BN_Nodes format.
+
+        execution_plan(flag=0)
+            Cached structure (ExecutionPlan) of the network used at initial time (0), after it (1) or by BN_sample_loopback (2).
+
+        compiled_cpd(flag=0)
+            Cached parameter tensors (NodeCPD) of the same network.
+
+        iter_batches(batch_size=1024)
+            Generate the time series of BN_data_gen in chunks of batch_size series.
+
+        iter_batches_loopback(batch_size=1024)
+            Generate the time series of BN_sample_gen_loopback in chunks of batch_size series.
+
+        iter_slices()
+            Generate the time series of BN_data_gen one time point at a time.
+
+        generate_range(i0, i1, seed)
+            Regenerate the series i0..i1-1 of a counter-based run.
+
+        generate_series(i, seed)
+            Regenerate the series i of a counter-based run.
+
+        write_batches(sink, batch_size=1024)
+            Generate the time series of BN_data_gen in chunks and write them to a file (see tsBNgen.sinks).
+
+        write_batches_loopback(sink, batch_size=1024)
+            Same as write_batches for BN_sample_gen_loopback.
+
+        iter_slices_loopback()
+            Generate the time series of BN_sample_gen_loopback one time point at a time.
+
+        clamped_gen(interventions=None, observations=None, loopback=False)
+            Generate the time series with some nodes forced to given values, with likelihood weights for the observed ones.
+
+        log_likelihood(data, loopback=False)
+            Log-probability of data under the model, per series and per time point.
+
+        linear_form(flag=0)
+            Cached VAR form of a network whose nodes are all continuous.
+
+        markov_chain(flag, depth)
+            Cached joint-state chain of a network whose nodes are all discrete.
+
+        regime_gen(regimes, schedule=None)
+            Generate the time series with a piecewise schedule of networks (regimes).
+
+        regime_networks(regimes)
+            Cached compiled networks of a list of regimes.
+
+        sweep_gen(variants, loopback=False)
+            Generate the time series of many CPD variants of the model in a single batched run.
+
+        to_dataframe(layout='long')
+            pandas DataFrame of the generated time series, in long or wide format.
+
+        to_arrow(layout='long')
+            pyarrow Table of the generated time series, in long or wide format.
+
+        simulator(seed=None, loopback=False)
+            Stateful Simulator that advances all the series one time step at a time.
+
+        checkpoint(path=None)
+            State of the last batched run: generator states, last slices of every series and regime.
+
+        resume(extra_T=0, extra_N=0, checkpoint=None)
+            Continue the last batched run (or a saved checkpoint) with more time points and/or more series.
         
         '''
         self.T=T
@@ -110,7 +210,7 @@ class tsBNgen:
         self.Mat=Mat
         self.Node_Type=Node_Type
         self.CPD=CPD 
-        self.Node=[[] for ii in range(self.Mat.shape[0])]
+        self.Node=[[] for ii in range(len(self.Node_Type))]
         self.Parent=Parent 
         self.N_level=N_level
         self.CPD2=CPD2
@@ -127,6 +227,20 @@ class tsBNgen:
             loopbacks2={}
         self.loopbacks2=loopbacks2 
         self.custom_time=custom_time
+        self.max_joint_entries=max_joint_entries
+        self._level_multiply={}
+        self._reset_run()
+        self.invalidate()
+
+    def _reset_run(self):
+        # every run starts from a clean slate, so that nothing of the previous run is read as part of it
+        self.BN_array=None
+        self.BN_node_arrays=None
+        self.BN_offsets=None
+        self.BN_Nodes=None
+        self.BN_variant=None
+        self.log_weights=None
+        self._run_state=None
 
     def BFS(self,Row):
         '''
@@ -143,14 +257,18 @@ class tsBNgen:
         list
             The node and all its children.
         '''
+        children = self.execution_plan().children
+        visited = np.zeros(len(children), dtype=bool)
+        visited[Row] = True
         child = [Row]
-        queue = []
-        queue.extend(np.nonzero(self.Mat.iloc[Row, :].values)[0].tolist())
-        while queue:
-            vertex = queue.pop(0)
-            if vertex not in child:
-                child.append(vertex)
-                queue.extend(np.nonzero(self.Mat.iloc[vertex, :].values)[0].tolist())
+        head = 0
+        while head < len(child):
+            vertex = child[head]
+            head += 1
+            for node in children[vertex].tolist():
+                if not visited[node]:
+                    visited[node] = True
+                    child.append(node)
         return child
 
     @staticmethod  
@@ -199,10 +317,7 @@ class tsBNgen:
         None
 
         '''
-        self.Role=[0]*len(self.top_order)
-        for count,ii in enumerate(self.top_order):
-            if(sum(self.Mat.iloc[:,ii]) ==0):
-                self.Role[ii]=1  
+        self.Role=self.execution_plan().is_root.astype(int).tolist()
 
     def DAG_ordering(self):
         '''
@@ -216,24 +331,7 @@ class tsBNgen:
         ------------
         None
         '''
-        queue = []
-        in_degree = np.count_nonzero(self.Mat, axis=0).tolist()
-        index = tsBNgen.zero_loc(in_degree)  
-        queue.extend(index)  
-        visited_count = 0
-        self.top_order = []
-        while queue:
-            P = queue.pop(0)
-            Neighbor = self.Child(P)
-            self.top_order.append(P)
-            for count, ii in enumerate(Neighbor):
-                in_degree[ii] = in_degree[ii] - 1
-                if (in_degree[ii] == 0):
-                    queue.append(ii)
-
-            visited_count = visited_count + 1
-        if (visited_count != self.Mat.shape[0]):
-            print('DAG has a cycle')
+        self.top_order = self.execution_plan().top_order.tolist()
     
     def Child(self, Row):  
         '''
@@ -249,9 +347,7 @@ class tsBNgen:
         list
              All the children of the given node.
         '''
-        child=[]
-        child.extend(np.nonzero(self.Mat.iloc[Row, :].values)[0].tolist())
-        return child
+        return self.execution_plan().children[Row].tolist()
     
     
     def Multinomial_Select(self,index1,index2,ii=0):
@@ -260,8 +356,8 @@ class tsBNgen:
 
         Parameters
         -----------
-        index1: string
-                key values of dictionary in CPD/CPD2/CPD3
+        index1: string, int or tuple
+                key values of dictionary in CPD/CPD2/CPD3 (see ExecutionPlan.cpd_key)
         index2: int
                 Determine which CPD entry to select.
         ii : int
@@ -274,34 +370,25 @@ class tsBNgen:
         '''
         if(self.flag==0):
             if(self.Role[ii]==1):  
-                Num=np.random.multinomial(1, self.CPD[str(index1)], size=1)
-                Pos=Num.tolist()[0].index(1)
-                return Pos+1
+                Num=np.random.multinomial(1, self.CPD[_cpd_key(self.CPD,index1)], size=1)
             else:  
-                Num=np.random.multinomial(1, self.CPD[str(index1)][index2], size=1)
-                Pos=Num.tolist()[0].index(1)
-                return Pos+1
+                Num=np.random.multinomial(1, self.CPD[_cpd_key(self.CPD,index1)][index2], size=1)
         elif (self.flag==1):
             if(len(self.Parent2[str(ii)])!=0):
-                Num=np.random.multinomial(1, self.CPD2[str(index1)][index2], size=1)
-                Pos=Num.tolist()[0].index(1)
+                Num=np.random.multinomial(1, self.CPD2[_cpd_key(self.CPD2,index1)][index2], size=1)
             else:
-                Num=np.random.multinomial(1, self.CPD2[str(index1)], size=1)
-            Pos=Num.tolist()[0].index(1)    
-            return Pos+1
-        
+                Num=np.random.multinomial(1, self.CPD2[_cpd_key(self.CPD2,index1)], size=1)
         elif (self.flag==2):
             if(len(self.Parent3[str(ii)])!=0):
-                Num=np.random.multinomial(1, self.CPD3[str(index1)][index2], size=1)
+                Num=np.random.multinomial(1, self.CPD3[_cpd_key(self.CPD3,index1)][index2], size=1)
             else:
-                Num=np.random.multinomial(1, self.CPD3[str(index1)], size=1)
-            Pos=Num.tolist()[0].index(1)
-            return Pos+1
+                Num=np.random.multinomial(1, self.CPD3[_cpd_key(self.CPD3,index1)], size=1)
+        return int(Num.argmax())+1
 
     
     
     def parents_len(self,Node): 
-        return np.count_nonzero(self.Mat.iloc[:,Node], axis=0).tolist() 
+        return int(self.execution_plan().in_degree[Node])
     
     def Roots_length(self): 
         '''
@@ -316,8 +403,7 @@ class tsBNgen:
         int
             Number of root nodes.
         '''
-        parent=np.count_nonzero(self.Mat, axis=0).tolist()  
-        return len([idx  for idx,ii in enumerate(parent) if ii==0])
+        return int(self.execution_plan().is_root.sum())
 
     @staticmethod
     def int_to_str(List):
@@ -381,91 +467,144 @@ class tsBNgen:
         '''
         self.DAG_ordering()
         self.Role_Assignment()
-        self.flag=0
-        self.Valid_BN(self.Parent)
+        self._sample_slice(0)
 
-        for count,ii in enumerate(self.top_order):
-            parent=tsBNgen.int_to_str(self.Parent[str(ii)])+str(ii)  
-            if(self.Role[ii]==1 and self.Node_Type[ii]=='D'):
-                self.Node[ii].append(self.Multinomial_Select(parent,0,ii))   
-            elif(self.Role[ii]==1 and self.Node_Type[ii]=='C'):
-                self.Node[ii].extend(self.Gaussian_select(ii,0)) 
-            elif(all(self.Node_Type[jj]=='D' for jj in self.Parent[str(ii)])): 
-                all_parents=[]
-                parent_N_level=[]
-                for count2,jj in enumerate(self.Parent[str(ii)]):
-                    all_parents.append(self.Node[jj][-1])
-                    parent_N_level.append(self.N_level[jj])
-           
-                self.all_parents=all_parents  
-                self.parent_N_level=parent_N_level 
-                CPD_entry=self.continous_cpd()
-
-                if(self.Node_Type[ii]=='D'):
-                    self.Node[ii].append(self.Multinomial_Select(parent,CPD_entry,ii))
-                elif(self.Node_Type[ii]=='C'):
-                    self.Node[ii].extend(self.Gaussian_select(parent,CPD_entry))
-
-            elif(any(self.Node_Type[jj]=='D' for jj in self.Parent[str(ii)])):
-                D_Parent=[kk for kk in self.Parent[str(ii)] if self.Node_Type[kk]=='D'] 
-                all_parents=[]
-                parent_N_level=[]
-                for count2,jj in enumerate(D_Parent):
-                    all_parents.append(self.Node[jj][-1])
-                    parent_N_level.append(self.N_level[jj])
-                
-                self.all_parents=all_parents
-                self.parent_N_level=parent_N_level
-                CPD_entry=self.continous_cpd()
-                
-                C_Parent=[kk for kk in self.Parent[str(ii)] if self.Node_Type[kk]=='C'] 
-                temp=0
-                for count3,kk in enumerate(C_Parent):  
-                    cont_SUM=self.CPD[str(parent)][str(kk)+str(ii)]['coefficient'][0][CPD_entry]*self.Node[kk][-1]
-                    temp=temp+cont_SUM
-                intercept=np.random.normal(0,self.CPD[str(parent)]['sigma_intercept'][CPD_entry],1)
-                self.Node[ii].extend(self.Gaussian_select(temp+intercept,self.CPD[str(parent)]['sigma'][CPD_entry],ii))
+    def _sample_slice(self,flag):
+        '''
+        Generate samples for all the nodes of the current time slice with the network selected by flag.
 
-            elif(all(self.Node_Type[jj]=='C' for jj in self.Parent[str(ii)])):  
+        The parents, their lags and the CPD keys are read from the cached execution plan, so the
+        loopbacks dictionaries are neither copied nor modified.
+        '''
+        plan=self.execution_plan(flag)
+        CPD=(self.CPD,self.CPD2,self.CPD3)[flag]
+        self.flag=flag
+        for ii in plan.top_order.tolist():
+            parent=plan.cpd_key(CPD,ii)
+            self.all_parents=[self.Node[jj][-off] for jj,off in zip(plan.d_parents[ii],plan.d_offsets[ii])]
+            self.parent_N_level=list(plan.d_levels[ii])
+            CPD_entry=self.continous_cpd()
+            if(hasattr(CPD[parent],'compile')):
+                # compact CPD (tsBNgen.compact), its rows are only available compiled
+                cpd=self.compiled_cpd(flag)[ii]
+                row=cpd.probabilities(cpd.entry(self.all_parents))
+                self.Node[ii].append(int(np.random.multinomial(1,row).argmax())+1)
+            elif(self.Node_Type[ii]=='D'):
+                self.Node[ii].append(self.Multinomial_Select(parent,CPD_entry,ii))
+            elif(len(plan.c_parents[ii])==0):
+                self.Node[ii].extend(self.Gaussian_select(parent,CPD_entry,ii))
+            else:
                 temp=0
-                for count3,kk in enumerate(self.Parent[str(ii)]):  
-                    cont_SUM=self.CPD[str(parent)][str(kk)+str(ii)]['coefficient'][0][0]*self.Node[kk][-1]
-                    temp=temp+cont_SUM
-                intercept=np.random.normal(0,self.CPD[str(parent)]['sigma_intercept'][0],1)
-                self.Node[ii].extend(self.Gaussian_select(temp+intercept,self.CPD[str(parent)]['sigma'][0],ii))
+                for kk,off,cc in zip(plan.c_parents[ii],plan.c_offsets[ii],plan.c_coef[ii]):
+                    temp=temp+edge_entry(CPD[parent],kk,ii)['coefficient'][cc][CPD_entry]*self.Node[kk][-off]
+                intercept=np.random.normal(0,CPD[parent]['sigma_intercept'][CPD_entry],1)
+                self.Node[ii].extend(self.Gaussian_select(temp+intercept,CPD[parent]['sigma'][CPD_entry],ii))
+
+    def execution_plan(self,flag=0):
+        '''
+        Structure of the network used at initial time (flag=0), after the initial time (flag=1) or 
+        by BN_sample_loopback (flag=2).
+
+        The plan is built once and reused until Mat, Node_Type, N_level, a Parent dictionary or 
+        a loopbacks dictionary is reassigned. Call invalidate() after modifying one of them in place.
+
+        Parameters
+        ------------
+        flag : int
+
+        Returns
+        ------------
+        ExecutionPlan
+        '''
+        if flag not in self._plans:
+            Parent,loopbacks=((self.Parent,None),(self.Parent2,self.loopbacks),(self.Parent3,self.loopbacks2))[flag]
+            self._plans[flag]=ExecutionPlan(self.Mat,self.Node_Type,self.N_level,Parent,loopbacks)
+        return self._plans[flag]
+
+    def compiled_cpd(self,flag=0):
+        '''
+        Parameter tensors of the network selected by flag (see execution_plan). They are compiled once 
+        and reused until the structure or the corresponding CPD dictionary is reassigned.
+
+        Returns
+        ------------
+        list
+            NodeCPD of every node.
+        '''
+        if flag not in self._compiled:
+            CPD=(self.CPD,self.CPD2,self.CPD3)[flag]
+            self._compiled[flag]=compile_cpd(self.execution_plan(flag),self.Node_Type,CPD)
+        return self._compiled[flag]
+
+    def linear_form(self,flag=0):
+        '''
+        VAR form (LinearGaussian) of the network selected by flag, for networks whose nodes are all continuous. 
+        It is cached with the compiled CPDs.
+
+        Returns
+        ------------
+        LinearGaussian
+        '''
+        if ('linear',flag) not in self._compiled:
+            self._compiled['linear',flag]=LinearGaussian(self.execution_plan(flag),self.compiled_cpd(flag))
+        return self._compiled['linear',flag]
+
+    def markov_chain(self,flag,depth):
+        '''
+        Joint-state chain (JointMarkovChain) of the network selected by flag, keeping depth past slices, for 
+        networks whose nodes are all discrete. It is cached with the compiled CPDs.
+
+        Returns
+        ------------
+        JointMarkovChain
+        '''
+        if ('markov',flag,depth) not in self._compiled:
+            levels=[self.N_level[ii] for ii in range(len(self.Node_Type))]
+            self._compiled['markov',flag,depth]=JointMarkovChain(self.execution_plan(flag),self.compiled_cpd(flag),levels,depth)
+        return self._compiled['markov',flag,depth]
+
+    def invalidate(self):
+        '''
+        Drop the cached execution plans and compiled CPDs, including those of the regimes.
+        '''
+        self.__dict__['_plans']={}
+        self.__dict__['_compiled']={}
+        self.__dict__['_regimes']={}
+
+    def __setattr__(self,name,value):
+        object.__setattr__(self,name,value)
+        if name in tsBNgen._STRUCTURE:
+            self.invalidate()
+        elif name in tsBNgen._PARAMETERS:
+            self.__dict__['_compiled']={}
 
-    
     def Gaussian_select(self,index1,index2,ii=0):   
         if(self.flag==0):
             C_Parent=[kk for kk in self.Parent[str(ii)] if self.Node_Type[kk]=='C']
             if(len(C_Parent)!=0):
                 return (np.random.normal(index1,index2, 1).tolist())
             else:
-                return (np.random.normal(self.CPD[str(index1)]['mu'+str(index2)],self.CPD[str(index1)]['sigma'+str(index2)], 1).tolist())
+                return (np.random.normal(self.CPD[_cpd_key(self.CPD,index1)]['mu'+str(index2)],self.CPD[_cpd_key(self.CPD,index1)]['sigma'+str(index2)], 1).tolist())
         
         elif(self.flag==1):
             C_Parent=[kk for kk in self.Parent2[str(ii)] if self.Node_Type[kk]=='C']
             if(len(C_Parent)!=0):
                 return (np.random.normal(index1,index2, 1).tolist())
             else:
-                return (np.random.normal(self.CPD2[str(index1)]['mu'+str(index2)],self.CPD2[str(index1)]['sigma'+str(index2)], 1).tolist())
+                return (np.random.normal(self.CPD2[_cpd_key(self.CPD2,index1)]['mu'+str(index2)],self.CPD2[_cpd_key(self.CPD2,index1)]['sigma'+str(index2)], 1).tolist())
         elif(self.flag==2):
             C_Parent=[kk for kk in self.Parent3[str(ii)] if self.Node_Type[kk]=='C']
             if(len(C_Parent)!=0):
                 return (np.random.normal(index1,index2, 1).tolist())
             else:
-                return (np.random.normal(self.CPD3[str(index1)]['mu'+str(index2)],self.CPD3[str(index1)]['sigma'+str(index2)], 1).tolist())
+                return (np.random.normal(self.CPD3[_cpd_key(self.CPD3,index1)]['mu'+str(index2)],self.CPD3[_cpd_key(self.CPD3,index1)]['sigma'+str(index2)], 1).tolist())
 
     
     def Level_multiplied(self):
-        self.level_multiply=[]
-        Temp=self.parent_N_level  
-        for ii in range(len(Temp)):
-            A1=reduce(lambda x, y: x*y,Temp)
-            self.level_multiply.append(A1)
-            Temp=Temp[1:]
-        self.level_multiply=self.level_multiply[1:]
-        self.level_multiply.insert(len(self.parent_N_level ),1)
+        key=tuple(self.parent_N_level)
+        if key not in self._level_multiply:
+            self._level_multiply[key]=strides(self.parent_N_level).tolist()
+        self.level_multiply=self._level_multiply[key]
 
     def continous_cpd(self):
         self.Level_multiplied()
@@ -494,128 +633,57 @@ class tsBNgen:
         Exception
             Parent of a discrete node cannot be continuous
         '''
-        self.flag=1
-        loopbacks_temp=self.loopbacks.copy()
-        self.Valid_BN(self.Parent2)
-        for count,ii in enumerate(self.top_order):
-            parent=tsBNgen.int_to_str(self.Parent2[str(ii)])+str(ii) 
-            if(all(self.Node_Type[jj]=='D' for jj in self.Parent2[str(ii)])):
-                temp=0
-                all_parents=[]
-                parent_N_level=[] 
-                for count2,jj in enumerate(self.Parent2[str(ii)]): 
-                    loopbacks_keys=tsBNgen.int_to_str(jj)+str(ii)  
-                    if(loopbacks_keys in self.loopbacks.keys()): 
-                        if(self.top_order.index(jj) < count):  
-                            for count3,mm in enumerate(self.loopbacks[loopbacks_keys]): 
-                                all_parents.append(self.Node[jj][-1-mm]) 
-                        else: 
-                            for count3,mm in enumerate(self.loopbacks[loopbacks_keys]): 
-                                LP=mm-1 
-                                all_parents.append(self.Node[jj][-1-LP]) 
-                        del self.loopbacks[loopbacks_keys]
-                    elif(jj != ii): 
-                        all_parents.append(self.Node[jj][-1])  
-                    parent_N_level.append(self.N_level[jj])
-
-                self.loopbacks=loopbacks_temp.copy()
-               
-                self.all_parents=all_parents  
-                self.parent_N_level=parent_N_level 
-                CPD_entry=self.continous_cpd()
-                
-                if(self.Node_Type[ii]=='D'):
-                    self.Node[ii].append(self.Multinomial_Select(parent,CPD_entry,ii))
-                elif(self.Node_Type[ii]=='C'):
-                    self.Node[ii].extend(self.Gaussian_select(parent,CPD_entry))
-            
-            elif(any(self.Node_Type[jj]=='D' for jj in self.Parent2[str(ii)])):
-                loopbacks_temp=self.loopbacks.copy()
-                D_Parent=[kk for kk in self.Parent2[str(ii)] if self.Node_Type[kk]=='D'] 
-                all_parents=[]
-                parent_N_level=[]
-                for count2,jj in enumerate(D_Parent):
-                    loopbacks_keys=tsBNgen.int_to_str(jj)+str(ii)  
-                    if(loopbacks_keys in self.loopbacks.keys()): 
-                        if(self.top_order.index(jj) < count):  
-                            for count3,mm in enumerate(self.loopbacks[loopbacks_keys]): 
-                                all_parents.append(self.Node[jj][-1-mm]) 
-                        else: 
-                            for count3,mm in enumerate(self.loopbacks[loopbacks_keys]): 
-                                LP=mm-1 
-                                all_parents.append(self.Node[jj][-1-LP]) 
-                        del self.loopbacks[loopbacks_keys]
-                    elif(jj != ii): 
-
-                        all_parents.append(self.Node[jj][-1])  
-                    parent_N_level.append(self.N_level[jj])
-
-                    self.loopbacks=loopbacks_temp.copy()
-                self.all_parents=all_parents
-                self.parent_N_level=parent_N_level
-                CPD_entry=self.continous_cpd()
-                
-                C_Parent=[kk for kk in self.Parent2[str(ii)] if self.Node_Type[kk]=='C'] 
-                temp=0
-                loopbacks_temp=self.loopbacks.copy()
-                for count3,kk in enumerate(C_Parent):
-                   loopbacks_keys=tsBNgen.int_to_str(kk)+str(ii)
-                   if(loopbacks_keys in self.loopbacks.keys()): 
-                       if(self.top_order.index(kk) < count): 
-                           for count3,mm in enumerate(self.loopbacks[loopbacks_keys]):
-                              cont_SUM=self.CPD2[str(parent)][str(kk)+str(ii)]['coefficient'][mm][CPD_entry]*self.Node[kk][-1-mm]
-                              temp=temp+cont_SUM
-                       else: 
-                           for count3,mm in enumerate(self.loopbacks[loopbacks_keys]): 
-                               LP=mm-1 
-                               cont_SUM=self.CPD2[str(parent)][str(kk)+str(ii)]['coefficient'][LP][CPD_entry]*self.Node[kk][-1-LP]
-                               temp=temp+cont_SUM
-                       del self.loopbacks[loopbacks_keys]
-                   elif(kk != ii):
-                       cont_SUM=self.CPD2[str(parent)][str(kk)+str(ii)]['coefficient'][0][CPD_entry]*self.Node[kk][-1]
-                       temp=temp+cont_SUM
-                intercept=np.random.normal(0,self.CPD2[str(parent)]['sigma_intercept'][CPD_entry],1)
-                self.Node[ii].extend(self.Gaussian_select(temp+intercept,self.CPD2[str(parent)]['sigma'][CPD_entry],ii))
-                self.loopbacks=loopbacks_temp.copy()
-            
-            elif(all(self.Node_Type[jj]=='C' for jj in self.Parent2[str(ii)])):
-                C_Parent=[kk for kk in self.Parent2[str(ii)] if self.Node_Type[kk]=='C'] 
-                temp=0
-                loopbacks_temp=self.loopbacks.copy()
-                for count3,kk in enumerate(C_Parent):
-                   loopbacks_keys=tsBNgen.int_to_str(kk)+str(ii)
-                   if(loopbacks_keys in self.loopbacks.keys()): 
-                       if(self.top_order.index(kk) < count):  
-                           for count3,mm in enumerate(self.loopbacks[loopbacks_keys]):
-                              cont_SUM=self.CPD2[str(parent)][str(kk)+str(ii)]['coefficient'][mm][0]*self.Node[kk][-1-mm]
-                              temp=temp+cont_SUM
-                       else: 
-                           for count3,mm in enumerate(self.loopbacks[loopbacks_keys]): 
-                               LP=mm-1 
-                               cont_SUM=self.CPD2[str(parent)][str(kk)+str(ii)]['coefficient'][LP][0]*self.Node[kk][-1-LP]
-                               temp=temp+cont_SUM
-                       del self.loopbacks[loopbacks_keys]
-                   elif(kk != ii):
-                       cont_SUM=self.CPD2[str(parent)][str(kk)+str(ii)]['coefficient'][0][0]*self.Node[kk][-1]
-                       temp=temp+cont_SUM
-                intercept=np.random.normal(0,self.CPD2[str(parent)]['sigma_intercept'][0],1)
-                self.Node[ii].extend(self.Gaussian_select(temp+sintercept,self.CPD2[str(parent)]['sigma'][0],ii))
-                self.loopbacks=loopbacks_temp.copy()
-            
+        self._sample_slice(1)
 
-        
-    def BN_data_gen(self):
+    def BN_data_gen(self,batched=True,output='array',dtype=np.float64,seed=None,n_jobs=1,block_size=BLOCK_SIZE,counter=False,lengths=None):
         '''
         It uses Initial_sample for initial time(t=0) and BN_sample for time point t=1 up to time t=T (length of time series)
 
         Parameters
         -------------
-        None
+        batched : bool
+            If True (default) all the series are generated at once with BatchSampler.
+            Otherwise the series are generated one by one with Initial_sample and BN_sample.
+
+        output : string
+            "array" (default) stores a preallocated (N, T, number of nodes) array in BN_array.
+            "nodes" stores one (N, T) array per node in BN_node_arrays, with uint8/uint16 levels
+            for the discrete nodes. Only used if batched is True.
+
+        dtype : dtype
+            float64 (default) or float32, the dtype of the continuous nodes.
+
+        seed : int
+            Seed of the run. Every block of block_size series gets its own generator, derived with
+            SeedSequence(seed).spawn(), so the output only depends on seed and block_size. If None the
+            generator is seeded from the global numpy state (see np.random.seed).
+
+        n_jobs : int
+            Number of worker processes sharing the blocks (-1 for one per CPU). For a given seed the
+            output is the same whatever n_jobs is.
+
+        block_size : int
+            Number of series per block of a seeded run.
+
+        counter : bool
+            Counter-based mode: every series gets its own Philox stream keyed by seed and its index, so that 
+            generate_range and generate_series return exactly the same series without generating the ones 
+            before them. Needs a seed; block_size is not used.
+
+        lengths : ndarray or callable
+            Length of every series, shape (N,), or a function that draws them, called as lengths(N,rng) with a 
+            numpy Generator seeded with seed (from the global numpy state if seed is None). T is then not used: the series are generated together and each one 
+            is retired from the batch when it ends. The output is packed: BN_array has shape (sum(lengths), number 
+            of nodes) and the per-node arrays of BN_node_arrays shape (sum(lengths),), the series one after the 
+            other, and BN_offsets holds where they start (the offsets of an Arrow list array). In counter mode 
+            every series is the beginning of the same series of a run with a common length.
 
         Returns
         -------------
-        None
-            None
+        ndarray or list
+            BN_array if output is "array", BN_node_arrays if output is "nodes" (None if batched is False).
+            BN_Nodes is built from them the first time it is accessed. With lengths, the tuple of the packed 
+            output and BN_offsets.
 
         Raises
         ------------
@@ -627,6 +695,9 @@ class tsBNgen:
         Use this function under the following conditions: custom_time variable is not specified 
         and the value of the loopback for all the variables is at most 1
         '''
+        if batched:
+            return self._batch_gen(None,output,dtype,seed,n_jobs,block_size,counter,lengths=lengths)
+        self._reset_run()
         keys = range(len(self.Node)) 
         self.BN_Nodes= dict(zip(keys, ([[] for ii in range(self.N)] for _ in keys )))
         for ii in range(self.N):
@@ -639,8 +710,685 @@ class tsBNgen:
                 self.BN_Nodes[jj][ii]=self.Node[jj] 
                 self.Node[jj]=[]                    
               
-        
+    def _batch_gen(self,switch,output,dtype,seed,n_jobs,block_size,counter=False,sampler=None,lengths=None):
+        if sampler is None:
+            sampler=BatchSampler(self)
+        self._reset_run()
+        if lengths is not None:
+            return self._ragged_gen(sampler,switch,output,dtype,seed,n_jobs,block_size,counter,lengths)
+        self.BN_array,self.BN_node_arrays=sampler.allocate(self.N,self.T,output,dtype,shared=n_jobs != 1)
+        out=self.BN_array if output=='array' else self.BN_node_arrays
+        if counter and seed is None:
+            raise ValueError("the counter-based mode needs a seed")
+        segments=[]
+        if seed is None and n_jobs == 1:
+            rng=np.random.default_rng(np.random.randint(np.iinfo(np.int32).max))
+            history=sampler.allocate_history(self.N)
+            sampler.sample(self.N,self.T,switch,rng,out,history)
+            segments.append((0,self.N,rng_state(rng),history))
+        else:
+            if seed is None:
+                seed=np.random.randint(np.iinfo(np.int32).max)
+            sampler.generate(self.N,self.T,switch,seed,out,n_jobs,block_size,counter,segments)
+        self._run_state=dict(N=self.N,T=self.T,switch=switch,seed=seed,block_size=block_size,counter=counter,
+                             segments=sorted(segments,key=lambda segment: segment[0]))
+        return self.BN_array if output=='array' else self.BN_node_arrays
+
+    def _ragged_gen(self,sampler,switch,output,dtype,seed,n_jobs,block_size,counter,lengths):
+        if callable(lengths):
+            lengths=lengths(self.N,np.random.default_rng(np.random.randint(np.iinfo(np.int32).max) if seed is None else seed))
+        lengths=np.asarray(lengths)
+        if lengths.shape != (self.N,) or np.any(lengths < 0) or np.any(lengths != np.round(lengths)):
+            raise ValueError("lengths should give a non-negative integer length for each of the %d series"%self.N)
+        if counter and seed is None:
+            raise ValueError("the counter-based mode needs a seed")
+        lengths=lengths.astype(np.int64)
+        self.BN_array,self.BN_node_arrays,self.BN_offsets=sampler.allocate_ragged(lengths,output,dtype,shared=n_jobs != 1)
+        out=self.BN_array if output=='array' else self.BN_node_arrays
+        if seed is None and n_jobs == 1:
+            sampler.sample_ragged(lengths,switch,out=out)
+        else:
+            if seed is None:
+                seed=np.random.randint(np.iinfo(np.int32).max)
+            sampler.generate(self.N,None,switch,seed,out,n_jobs,block_size,counter,lengths=lengths)
+        return out,self.BN_offsets
+
+    def clamped_gen(self,interventions=None,observations=None,loopback=False,output='array',dtype=np.float64,seed=None,block_size=BLOCK_SIZE):
+        '''
+        Generate the N time series of BN_data_gen (BN_sample_gen_loopback if loopback is True) with some nodes forced 
+        to given values, in the batched sampler and without rejection.
+
+        An intervention replaces the sample of the node (the draw of Multinomial_Select or Gaussian_select) with the 
+        given value, and its children are sampled given that value. An observation does the same and also adds the 
+        log-probability of the value given the parents of the node to the log-weight of the series (likelihood 
+        weighting): weighted averages over the series with weights exp(log_weights) estimate expectations given the
+        observations.
+
+        Parameters
+        -------------
+        interventions, observations : dict
+            Keyed by node, values that broadcast to (N, T) with NaN where the node is sampled as usual (see Evidence).
+            Discrete nodes take levels 1..N_level. 
+
+        loopback : bool
+            Use the networks of BN_sample_gen_loopback.
+
+        output, dtype, seed, block_size :
+            See BN_data_gen.
+
+        Returns
+        -------------
+        tuple
+            BN_array (or BN_node_arrays if output is "nodes") and log_weights, the log-weight of every series.
+        '''
+        sampler=BatchSampler(self)
+        self._reset_run()
+        self.BN_array,self.BN_node_arrays=sampler.allocate(self.N,self.T,output,dtype)
+        out=self.BN_array if output=='array' else self.BN_node_arrays
+        evidence=Evidence(self.N,self.T,interventions,observations)
+        switch=self._loopback_switch() if loopback else None
+        if seed is None:
+            sampler.sample(self.N,self.T,switch,out=out,evidence=evidence)
+        else:
+            sampler.sample_range(0,self.N,self.N,self.T,switch,seed,out,block_size,evidence=evidence)
+        self.log_weights=evidence.log_weight
+        return out,self.log_weights
+
+    def log_likelihood(self,data,loopback=False,batch_size=BLOCK_SIZE):
+        '''
+        Log-probability of data under the model, with the parents, loopbacks and networks of BN_data_gen 
+        (BN_sample_gen_loopback if loopback is True). The computation is vectorized over series and time.
+
+        Parameters
+        -------------
+        data : ndarray or list
+            Samples of shape (N, T, number of nodes), or one (N, T) array per node, e.g. BN_array or BN_node_arrays.
+
+        loopback : bool
+            Score with the networks of BN_sample_gen_loopback.
+
+        batch_size : int
+            Number of series evaluated together.
+
+        Returns
+        -------------
+        tuple
+            The log-likelihood of every series, shape (N,), and of every time point of every series, shape (N, T).
+            Continuous nodes contribute their log-density.
+        '''
+        switch=self._loopback_switch() if loopback else None
+        per_step=BatchSampler(self).log_likelihood(data,switch,batch_size)
+        return per_step.sum(axis=1),per_step
+
+    def regime_gen(self,regimes,schedule=None,output='array',dtype=np.float64,seed=None,n_jobs=1,block_size=BLOCK_SIZE,counter=False):
+        '''
+        Generate the N time series with a piecewise schedule of networks (regimes), e.g. the warm-up, nominal, 
+        degraded and maintenance phases of a lifecycle, in a single batched run.
+
+        Every distinct network is compiled once (see regime_networks) and the batched sampler switches between 
+        them without any per-step validation: the whole schedule is checked before the run starts.
+
+        Parameters
+        -------------
+        regimes : list
+            (start_t, Mat, Parent, CPD, loopbacks) of every regime, in the format of Mat/Parent2/CPD2/loopbacks 
+            (Parent/CPD with loopbacks None for the regime of t=0). A regime is used from its start_t until the 
+            start of the next one, so the start times must increase from 0. Node_Type and N_level are the ones of 
+            the model, the adjacency matrix may differ. A regime can repeat the networks of another one.
+
+        schedule : ndarray
+            Index of the regime (position in regimes) of every time point, shape (T,), or of every series and time 
+            point, shape (N, T), instead of the start times (which are then ignored and can be None).
+
+        output, dtype, seed, n_jobs, block_size, counter :
+            See BN_data_gen. Counter-based runs need the same regime for all the series at every time point.
+
+        Returns
+        -------------
+        ndarray or list
+            BN_array if output is "array", BN_node_arrays if output is "nodes". The run cannot be checkpointed.
+
+        Raises
+        -------------
+        ValueError
+            If the start times do not increase from 0, the schedule does not give a regime for every time point 
+            (and series), or a loopback reaches before t=0.
+
+        Examples
+        -------------
+        >>> regimes=[(0,Mat,Parent,CPD,None),(1,Mat,Parent2,warmup,loopbacks),(50,Mat,Parent2,nominal,loopbacks),
+        ...          (400,Mat,Parent2,degraded,loopbacks),(450,Mat,Parent2,nominal,loopbacks)]
+        >>> model.regime_gen(regimes,seed=0)
+        '''
+        networks,index=self.regime_networks(regimes)
+        if schedule is None:
+            starts=[regime[0] for regime in regimes]
+            if starts[0]!=0 or any(b<=a for a,b in zip(starts,starts[1:])):
+                raise ValueError("the start times of the regimes must increase from 0")
+            schedule=np.searchsorted(starts,np.arange(self.T),side='right')-1
+        schedule=np.asarray(schedule)
+        if np.any((schedule<0)|(schedule>=len(regimes))) or schedule.ndim not in (1,2) or (schedule.ndim==2 and len(schedule)!=self.N):
+            raise ValueError("the schedule should give one of the %d regimes for every time point, shape (T,) or (N, T)"%len(regimes))
+        out=self._batch_gen(np.asarray(index)[schedule],output,dtype,seed,n_jobs,block_size,counter,
+                            BatchSampler(self,networks=networks))
+        self._run_state=None
+        return out
+
+    def regime_networks(self,regimes):
+        '''
+        Compiled networks of a list of regimes (see regime_gen). A network given by the same Mat, Parent, CPD and 
+        loopbacks objects in several regimes is compiled once, and kept until invalidate() is called or the 
+        structure of the model is reassigned. Call invalidate() after modifying one of these objects in place.
+
+        Returns
+        -------------
+        tuple
+            The list of (ExecutionPlan, compiled CPDs) of the distinct networks, and the position of the network 
+            of every regime in that list.
+        '''
+        networks,index,position={},[],{}
+        for regime in regimes:
+            key=tuple(id(value) for value in regime[1:])
+            if key not in self._regimes:
+                Mat,Parent,CPD,loopbacks=regime[1:]
+                plan=ExecutionPlan(Mat,self.Node_Type,self.N_level,Parent,loopbacks)
+                # the objects are kept alongside so that their ids cannot be reused while the network is cached
+                self._regimes[key]=(plan,compile_cpd(plan,self.Node_Type,CPD),regime[1:])
+            if key not in position:
+                position[key]=len(position)
+                networks[key]=self._regimes[key][:2]
+            index.append(position[key])
+        return list(networks.values()),index
+
+    def sweep_gen(self,variants,loopback=False,output='array',dtype=np.float64,seed=None,n_jobs=1,block_size=BLOCK_SIZE,counter=False):
+        '''
+        Generate the N time series of BN_data_gen (BN_sample_gen_loopback if loopback is True) for K variants of the 
+        CPDs of the model, e.g. for a sensitivity study, in a single batched run of K x N series.
+
+        The variants share Mat, Node_Type, N_level, the parents and the loopbacks of the model, so the execution plans 
+        are built once. The tables of the nodes whose CPD differs between the variants are stacked (see stack_cpds) 
+        and every node is sampled for the series of all the variants with one NumPy call per time step.
+
+        Parameters
+        -------------
+        variants : list
+            (CPD, CPD2) or (CPD, CPD2, CPD3) of every variant, e.g. as returned by fit. A CPD that is None or missing 
+            is the one of the model, and a CPD dictionary only needs the entries that differ from the model.
+
+        loopback : bool
+            Use the networks of BN_sample_gen_loopback.
+
+        output, dtype, seed, n_jobs, block_size, counter :
+            See BN_data_gen. A seeded sweep does not reproduce the runs of the variants one by one. The networks
+            whose nodes are all discrete or all continuous lose their compiled fast paths (JointMarkovChain,
+            LinearGaussian) as soon as two variants differ, so their draws are those of the node-by-node path.
+
+        Returns
+        -------------
+        tuple
+            BN_array (or BN_node_arrays if output is "nodes") with the K x N series, variant by variant, so that 
+            BN_array.reshape(K,N,T,-1) separates them, and BN_variant, the variant of every series, shape (K x N,).
+
+        Raises
+        -------------
+        ValueError
+            If a node has a compact CPD (tsBNgen.compact) that is not the same in every variant.
+
+        Examples
+        -------------
+        >>> variants=[(None,{'00':[p,1-p]}) for p in np.linspace(0.1,0.9,100)]
+        >>> array,variant=model.sweep_gen(variants,seed=0)
+        '''
+        sampler=BatchSampler(self,networks=self._sweep_networks(variants))
+        N=len(variants)*self.N
+        variant=np.repeat(np.arange(len(variants)),self.N)
+        self._reset_run()
+        self.BN_array,self.BN_node_arrays=sampler.allocate(N,self.T,output,dtype,shared=n_jobs != 1)
+        out=self.BN_array if output=='array' else self.BN_node_arrays
+        if counter and seed is None:
+            raise ValueError("the counter-based mode needs a seed")
+        switch=self._loopback_switch() if loopback else None
+        if seed is None and n_jobs == 1:
+            sampler.sample(N,self.T,switch,out=out,variant=variant)
+        else:
+            if seed is None:
+                seed=np.random.randint(np.iinfo(np.int32).max)
+            sampler.generate(N,self.T,switch,seed,out,n_jobs,block_size,counter,variant=variant)
+        self.BN_variant=variant
+        return out,variant
+
+    def _sweep_networks(self,variants):
+        # the nodes whose CPD entry is the one of the model keep its compiled CPD
+        networks=[]
+        for flag in ([0,1,2] if self.Parent3 else [0,1]):
+            plan,base=self.execution_plan(flag),self.compiled_cpd(flag)
+            model_cpd=(self.CPD,self.CPD2,self.CPD3)[flag]
+            compiled=[]
+            for cpds in variants:
+                cpd=model_cpd if flag >= len(cpds) or cpds[flag] is None else cpds[flag]
+                compiled.append([base[ii] if self._same_entry(plan,ii,cpd,model_cpd)
+                                 else compile_node(ii,plan,self.Node_Type,cpd) for ii in range(plan.n_nodes)])
+            networks.append((plan,stack_cpds(compiled)))
+        return networks
+
+    @staticmethod
+    def _same_entry(plan,ii,cpd,model_cpd):
+        # a variant that leaves node ii out, or gives it the entry of the model, keeps the compiled CPD of the model
+        try:
+            entry=cpd[plan.cpd_key(cpd,ii)]
+        except KeyError:
+            return True
+        return entry is model_cpd[plan.cpd_key(model_cpd,ii)]
+
+    def simulator(self,seed=None,loopback=False,dtype=np.float64,block_size=BLOCK_SIZE):
+        '''
+        Stateful Simulator that advances all the N series one time step at a time (see tsBNgen.simulator).
+
+        Parameters
+        -------------
+        seed, loopback, dtype, block_size :
+            See Simulator. With a seed, the slices are the time points of BN_data_gen (BN_sample_gen_loopback 
+            if loopback is True) with the same seed.
+
+        Returns
+        -------------
+        Simulator
+        '''
+        return Simulator(self,seed,loopback,dtype,block_size)
+
+    def checkpoint(self,path=None):
+        '''
+        State of the last batched run of BN_data_gen or BN_sample_gen_loopback, enough to continue it with resume().
+
+        Parameters
+        -------------
+        path : string
+            If given, the checkpoint is also saved to this .npz file.
+
+        Returns
+        -------------
+        dict
+            N, T, switch (time point at which CPD3 takes over, None for BN_data_gen), seed, block_size, counter, 
+            segments (the (start, stop) series of every generator), rng_states (the state of every generator) 
+            and history (the last max(loopback)+1 slices of every series, stored at t % (max(loopback)+1)).
+        '''
+        if self._run_state is None:
+            raise ValueError("no batched run to checkpoint, run BN_data_gen or BN_sample_gen_loopback first")
+        state=self._run_state
+        checkpoint={key:state[key] for key in ('N','T','switch','seed','block_size','counter')}
+        checkpoint['segments']=[(start,stop) for start,stop,_,_ in state['segments']]
+        checkpoint['rng_states']=[rng for _,_,rng,_ in state['segments']]
+        checkpoint['history']=np.concatenate([history for _,_,_,history in state['segments']],axis=1)
+        if path is not None:
+            meta={key:value for key,value in checkpoint.items() if key != 'history'}
+            meta['seed']=None if meta['seed'] is None else int(meta['seed'])
+            np.savez(path,history=checkpoint['history'],meta=np.array(json.dumps(meta)))
+        return checkpoint
+
+    @staticmethod
+    def load_checkpoint(path):
+        '''
+        Load a checkpoint saved by checkpoint(path).
+        '''
+        with np.load(path) as data:
+            checkpoint=json.loads(str(data['meta']))
+            checkpoint['history']=data['history']
+        checkpoint['segments']=[tuple(segment) for segment in checkpoint['segments']]
+        return checkpoint
+
+    def resume(self,extra_T=0,extra_N=0,checkpoint=None,output='array',dtype=np.float64):
+        '''
+        Continue a batched run with extra_T more time points and extra_N more series. The result is identical
+        to a single run of N+extra_N series of length T+extra_T with the same seed, and resume can be called 
+        again on it. N and T are updated.
+
+        Parameters
+        -------------
+        extra_T : int
+            Number of time points to add to every series.
+
+        extra_N : int
+            Number of series to add. The run must be seeded, and either counter-based or of a number of series N
+            that is a multiple of its block_size, so that the existing series stay as they are.
+
+        checkpoint : dict or string
+            The checkpoint to continue, or the path of a saved one. Defaults to the last batched run of this object.
+
+        output, dtype :
+            See BN_data_gen.
+
+        Returns
+        -------------
+        tuple
+            The time points T..T+extra_T-1 of the series 0..N-1 (shape (N, extra_T, number of nodes) if output is
+            "array") and all the T+extra_T time points of the series N..N+extra_N-1.
+
+        Raises
+        -------------
+        ValueError
+            If there is no checkpoint, or extra_N is used with an unseeded run or with a block-seeded run whose
+            last block of block_size series is partly filled (its series would be drawn again).
+        '''
+        if isinstance(checkpoint,str):
+            checkpoint=self.load_checkpoint(checkpoint)
+        elif checkpoint is None:
+            checkpoint=self.checkpoint()
+        N,T,switch,seed=checkpoint['N'],checkpoint['T'],checkpoint['switch'],checkpoint['seed']
+        block_size,counter=checkpoint['block_size'],checkpoint['counter']
+        if extra_N and seed is None:
+            raise ValueError("only a seeded run can be extended with more series")
+        if extra_N and not counter and N%block_size:
+            raise ValueError("the last block of %d series is partly filled (N=%d), extra_N needs a counter-based run "
+                             "or N a multiple of block_size" % (block_size,N))
+        sampler=BatchSampler(self)
+        if checkpoint['history'].shape[0] != sampler.depth:
+            raise ValueError("the checkpoint does not match the loopbacks of the network")
+        N2,T2=N+extra_N,T+extra_T
+        segments=[]
+
+        array,columns=sampler.allocate(N,extra_T,output,dtype)
+        extended=array if output=='array' else columns
+        for (s0,s1),state in zip(checkpoint['segments'],checkpoint['rng_states']):
+            rng=restore_rng(state,seed,s0,s1)
+            history=checkpoint['history'][:,s0:s1].copy()
+            sampler.sample(s1-s0,T2,switch,rng,_rows(extended,s0,s1),history,T)
+            segments.append((s0,s1,rng_state(rng),history))
+
+        array,columns=sampler.allocate(extra_N,T2,output,dtype)
+        added=array if output=='array' else columns
+        if extra_N:
+            sampler.sample_range(N,N2,N2,T2,switch,seed,added,block_size,counter=counter,state=segments)
+
+        self.N,self.T=N2,T2
+        self._run_state=dict(N=N2,T=T2,switch=switch,seed=seed,block_size=block_size,counter=counter,segments=segments)
+        return extended,added
+
+    def _loopback_switch(self):
+        '''
+        Time point at which CPD3/Parent3/loopbacks2 take over in BN_sample_gen_loopback.
+        '''
+        if self.custom_time == 0:
+            return max(sum(self.loopbacks2.values(),[]))
+        return self.custom_time
+
+    def generate_range(self,i0,i1,seed,loopback=False,output='array',dtype=np.float64):
+        '''
+        Regenerate the series i0..i1-1 of a counter-based run (see the counter argument of BN_data_gen), 
+        without generating the series before them. Nothing is stored on the object.
+
+        Parameters
+        -------------
+        i0, i1 : int
+            Range of series. i1 may exceed N.
+
+        seed : int
+            Seed of the run.
+
+        loopback : bool
+            False for the series of BN_data_gen, True for the series of BN_sample_gen_loopback.
+
+        output, dtype :
+            See BN_data_gen.
+
+        Returns
+        -------------
+        ndarray or list
+            A (i1-i0, T, number of nodes) array if output is "array", one (i1-i0, T) array per node if output is "nodes".
+        '''
+        sampler=BatchSampler(self)
+        array,columns=sampler.allocate(i1-i0,self.T,output,dtype)
+        out=array if output=='array' else columns
+        switch=self._loopback_switch() if loopback else None
+        return sampler.sample_range(i0,i1,i1,self.T,switch,seed,out,counter=True)
+
+    def generate_series(self,i,seed,loopback=False,output='array',dtype=np.float64):
+        '''
+        Regenerate the series i of a counter-based run, see generate_range.
+
+        Returns
+        -------------
+        ndarray or list
+            A (T, number of nodes) array if output is "array", one (T,) array per node if output is "nodes".
+        '''
+        out=self.generate_range(i,i+1,seed,loopback,output,dtype)
+        if output=='array':
+            return out[0]
+        return [col[0] for col in out]
+
+    def iter_batches(self,batch_size=1024,output='array',dtype=np.float64,seed=None,block_size=None):
+        '''
+        Generate the N time series of BN_data_gen in chunks, so that peak memory depends on batch_size only.
+
+        Parameters
+        -------------
+        batch_size : int
+            Number of time series per chunk. The last chunk holds the remaining N % batch_size series.
+
+        output, dtype, seed :
+            See BN_data_gen.
+
+        block_size : int
+            Number of series per generator of a seeded run, batch_size by default. A block is generated whole,
+            so it cannot be larger than batch_size: at most one chunk and one block are held in memory. With a 
+            seed, the chunks are exactly the series of BN_data_gen with the same seed and block_size.
+
+        Yields
+        -------------
+        ndarray or list
+            A (batch_size, T, number of nodes) array if output is "array", one (batch_size, T) array per node 
+            if output is "nodes". Nothing is stored on the object.
+
+        Raises
+        -------------
+        ValueError
+            If the run is seeded and block_size is larger than batch_size.
+        '''
+        return self._iter_batches(None,batch_size,output,dtype,seed,block_size)
+
+    def iter_batches_loopback(self,batch_size=1024,output='array',dtype=np.float64,seed=None,block_size=None):
+        '''
+        Same as iter_batches for the networks of BN_sample_gen_loopback (CPD3/Parent3/loopbacks2).
+        '''
+        return self._iter_batches(self._loopback_switch(),batch_size,output,dtype,seed,block_size)
+
+    def _iter_batches(self,switch,batch_size,output,dtype,seed,block_size):
+        # checked here rather than in the generator, so that the error is raised by the call
+        if block_size is None:
+            block_size=batch_size
+        if seed is not None and block_size > batch_size:
+            raise ValueError("block_size (%d) cannot be larger than batch_size (%d): a block is held in memory whole"
+                             %(block_size,batch_size))
+        return self._batches(switch,batch_size,output,dtype,seed,block_size)
+
+    def _batches(self,switch,batch_size,output,dtype,seed,block_size):
+        sampler=BatchSampler(self)
+        rng=np.random.default_rng(np.random.randint(np.iinfo(np.int32).max))
+        cache={}
+        for start in range(0,self.N,batch_size):
+            n=min(batch_size,self.N-start)
+            array,columns=sampler.allocate(n,self.T,output,dtype)
+            out=array if output=='array' else columns
+            if seed is None:
+                sampler.sample(n,self.T,switch,rng=rng,out=out)
+            else:
+                sampler.sample_range(start,start+n,self.N,self.T,switch,seed,out,block_size,cache)
+            yield array if output=='array' else columns
+
+    def write_batches(self,sink,batch_size=1024,dtype=np.float64,seed=None,block_size=None):
+        '''
+        Generate the N time series of BN_data_gen in chunks and write every chunk to sink as soon as it is
+        generated, so that the dataset is never held in memory.
+
+        Parameters
+        -------------
+        sink : NpySink, ParquetSink, HDF5Sink
+            Where to write the samples, see tsBNgen.sinks. Any object with the methods open(N, T, dtypes),
+            write(start, columns) and close() can be used; columns holds one (n, T) array per node.
+
+        batch_size, dtype, seed, block_size :
+            See iter_batches. Discrete nodes are passed to the sink with the smallest unsigned integer dtype 
+            that holds their levels.
+
+        Returns
+        -------------
+        sink
+        '''
+        return self._write_batches(None,sink,batch_size,dtype,seed,block_size)
+
+    def write_batches_loopback(self,sink,batch_size=1024,dtype=np.float64,seed=None,block_size=None):
+        '''
+        Same as write_batches for the networks of BN_sample_gen_loopback (CPD3/Parent3/loopbacks2).
+        '''
+        return self._write_batches(self._loopback_switch(),sink,batch_size,dtype,seed,block_size)
+
+    def _write_batches(self,switch,sink,batch_size,dtype,seed,block_size):
+        batches=self._iter_batches(switch,batch_size,'nodes',dtype,seed,block_size)
+        _,columns=BatchSampler(self).allocate(0,self.T,'nodes',dtype)
+        sink.open(self.N,self.T,[col.dtype for col in columns])
+        try:
+            start=0
+            for columns in batches:
+                sink.write(start,columns)
+                start+=len(columns[0])
+        finally:
+            sink.close()
+        return sink
+
+    def iter_slices(self,seed=None,block_size=BLOCK_SIZE):
+        '''
+        Generate the N time series of BN_data_gen one time point at a time. Only the last max(loopback)+1 
+        slices are kept in memory, so T can be arbitrarily large.
+
+        Parameters
+        -------------
+        seed, block_size :
+            See BN_data_gen. With a seed, the slices are exactly the time points of BN_data_gen with the same seed.
+
+        Yields
+        -------------
+        ndarray
+            The samples of all the series at t=0, 1, ..., T-1, shape (N, number of nodes). The array is reused
+            for later time points; copy it to keep it.
+        '''
+        return self._iter_slices(None,seed,block_size)
+
+    def iter_slices_loopback(self,seed=None,block_size=BLOCK_SIZE):
+        '''
+        Same as iter_slices for the networks of BN_sample_gen_loopback (CPD3/Parent3/loopbacks2).
+        '''
+        return self._iter_slices(self._loopback_switch(),seed,block_size)
+
+    def _iter_slices(self,switch,seed,block_size):
+        sampler=BatchSampler(self)
+        if seed is None:
+            yield from sampler.slices(self.N,self.T,switch)
+            return
+        blocks=[sampler.slices(min(block_size,self.N-start),self.T,switch,block_rng(seed,start//block_size))
+                for start in range(0,self.N,block_size)]
+        if len(blocks) == 1:
+            yield from blocks[0]
+            return
+        out=np.empty((self.N,sampler.n_nodes))
+        for parts in zip(*blocks):
+            np.concatenate(parts,out=out)
+            yield out
+
+    @property
+    def BN_Nodes(self):
+        '''
+        For every node, a list holding one list of samples per time series. After a batched run it is
+        built from BN_node_arrays the first time it is accessed.
+        '''
+        if self._BN_Nodes is None and self.BN_node_arrays is not None:
+            packed=self.BN_node_arrays[0].ndim == 1
+            self._BN_Nodes=self.array_to_nodes(self.BN_node_arrays,self.BN_offsets if packed else None)
+        return self._BN_Nodes
+
+    @BN_Nodes.setter
+    def BN_Nodes(self,value):
+        self._BN_Nodes=value
+
+    def array_to_nodes(self,array,offsets=None):
+        '''
+        Convert generated samples to the BN_Nodes format.
+
+        Parameters
+        -------------
+        array : ndarray or list
+            Samples of shape (N, T, number of nodes), or a list of one (N, T) array per node.
+
+        offsets : ndarray
+            Offsets of the series if the samples are packed (see the lengths of BN_data_gen).
+
+        Returns
+        -------------
+        dict
+            For every node, a list holding one list of samples per time series.
+        '''
+        if isinstance(array,np.ndarray):
+            array=[array[...,jj] for jj in range(array.shape[-1])]
+        BN_Nodes={}
+        for jj,values in enumerate(array):
+            if(self.Node_Type[jj]=='D'):
+                values=values.astype(int)
+            if offsets is None:
+                BN_Nodes[jj]=values.tolist()
+            else:
+                BN_Nodes[jj]=[series.tolist() for series in np.split(values,offsets[1:-1])]
+        return BN_Nodes
     
+    def _samples(self):
+        # per-node arrays of the last run and the offsets of the series if they are packed
+        if self.BN_node_arrays is not None:
+            return self.BN_node_arrays,self.BN_offsets if self.BN_node_arrays[0].ndim == 1 else None
+        if self.BN_Nodes is None:
+            raise ValueError("no time series have been generated yet")
+        lengths=[len(series) for series in self.BN_Nodes[0]]
+        if len(set(lengths)) <= 1:
+            return [np.asarray(self.BN_Nodes[jj]) for jj in range(len(self.Node_Type))],None
+        return [np.concatenate(self.BN_Nodes[jj]) for jj in range(len(self.Node_Type))],np.cumsum([0]+lengths)
+
+    def to_dataframe(self,layout='long'):
+        '''
+        pandas DataFrame of the time series of the last run, see tsBNgen.export.to_dataframe. It is built from 
+        the arrays of the batched run (without copying the continuous nodes), not from BN_Nodes.
+
+        Parameters
+        -------------
+        layout : string
+            "long" for one row per (series, time) and one column per node, "wide" for one row per series and 
+            one column per (node, time). Discrete nodes are Categorical with the categories 1..N_level.
+
+        Returns
+        -------------
+        pandas.DataFrame
+
+        Examples
+        -------------
+        >>> model.BN_data_gen(seed=0)
+        >>> df=model.to_dataframe()
+        >>> df.loc[3]            # the series 3, one row per time point
+        '''
+        columns,offsets=self._samples()
+        return export.to_dataframe(columns,self.Node_Type,self.N_level,offsets,layout)
+
+    def to_arrow(self,layout='long'):
+        '''
+        pyarrow Table of the time series of the last run, see tsBNgen.export.to_arrow. Requires pyarrow.
+
+        Parameters
+        -------------
+        layout : string
+            "long" for one row per (series, time) as written by ParquetSink, "wide" for one row per series with 
+            one list column per node. Discrete nodes are dictionary arrays of the levels 1..N_level.
+
+        Returns
+        -------------
+        pyarrow.Table
+        '''
+        columns,offsets=self._samples()
+        return export.to_arrow(columns,self.Node_Type,self.N_level,offsets,layout)
+
     def BN_sample_loopback(self):
         '''
         Generate samples for all the nodes given CPD3 and Parent3 are used.
@@ -662,128 +1410,25 @@ class tsBNgen:
         ------------
         Use this function when you want to incorporate three BNs.
         '''
-        self.flag=2
-        self.Valid_BN(self.Parent3)
-        self.DAG_ordering()  
-        loopbacks_temp=self.loopbacks2.copy()  
-        for count,ii in enumerate(self.top_order):  
-            parent=tsBNgen.int_to_str(self.Parent3[str(ii)])+str(ii) 
-            if(all(self.Node_Type[jj]=='D' for jj in self.Parent3[str(ii)])):
-                temp=0
-                all_parents=[]
-                parent_N_level=[]  
-                for count2,jj in enumerate(self.Parent3[str(ii)]): 
-                    loopbacks_keys=tsBNgen.int_to_str(jj)+str(ii)  
-                    if(loopbacks_keys in self.loopbacks2.keys()): 
-                        if(self.top_order.index(jj) < count):  
-                            for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]): 
-                                all_parents.append(self.Node[jj][-1-mm]) 
-                        else: 
-                            for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]): 
-                                LP=mm-1 
-                                all_parents.append(self.Node[jj][-1-LP]) 
-                        del self.loopbacks2[loopbacks_keys]
-
-                    
-                    elif(jj != ii): 
-                        all_parents.append(self.Node[jj][-1])  
-                    parent_N_level.append(self.N_level[jj])
-
-                self.loopbacks2=loopbacks_temp.copy()
-                self.all_parents=all_parents  
-                self.parent_N_level=parent_N_level  
-                CPD_entry=self.continous_cpd()
-                if(self.Node_Type[ii]=='D'):
-                    self.Node[ii].append(self.Multinomial_Select(parent,CPD_entry,ii))
-                elif(self.Node_Type[ii]=='C'):
-                    self.Node[ii].extend(self.Gaussian_select(parent,CPD_entry))
-            elif(any(self.Node_Type[jj]=='D' for jj in self.Parent3[str(ii)])):
-                loopbacks_temp=self.loopbacks2.copy()
-                D_Parent=[kk for kk in self.Parent3[str(ii)] if self.Node_Type[kk]=='D']
-                temp=0
-                all_parents=[]
-                parent_N_level=[]  
-                for count2,jj in enumerate(D_Parent):  
-                    loopbacks_keys=tsBNgen.int_to_str(jj)+str(ii)  
-                    if(loopbacks_keys in self.loopbacks2.keys()): 
-                        if(self.top_order.index(jj) < count):  
-                            for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]): 
-                                all_parents.append(self.Node[jj][-1-mm]) 
-                        else: 
-                            for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]): 
-                                LP=mm-1 
-                                all_parents.append(self.Node[jj][-1-LP]) 
-                        del self.loopbacks2[loopbacks_keys]
-
-                    
-                    elif(jj != ii): 
-                        all_parents.append(self.Node[jj][-1])  
-                    parent_N_level.append(self.N_level[jj])
-
-                self.loopbacks2=loopbacks_temp.copy()
-                self.all_parents=all_parents  
-                self.parent_N_level=parent_N_level  
-                CPD_entry=self.continous_cpd()
-
-                C_Parent=[kk for kk in self.Parent3[str(ii)] if self.Node_Type[kk]=='C'] 
-                temp=0
-                loopbacks_temp=self.loopbacks2.copy()
-                for count3,kk in enumerate(C_Parent):
-                   loopbacks_keys=tsBNgen.int_to_str(kk)+str(ii)
-                   if(loopbacks_keys in self.loopbacks2.keys()): 
-                       if(self.top_order.index(kk) < count):  
-                           for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]):
-                              cont_SUM=self.CPD3[str(parent)][str(kk)+str(ii)]['coefficient'][mm][CPD_entry]*self.Node[kk][-1-mm]
-                              temp=temp+cont_SUM
-                       else: 
-                           for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]): 
-                               LP=mm-1 
-                               cont_SUM=self.CPD3[str(parent)][str(kk)+str(ii)]['coefficient'][LP][CPD_entry]*self.Node[kk][-1-LP]
-                               temp=temp+cont_SUM
-                       del self.loopbacks[loopbacks_keys]
-                   elif(kk != ii):
-                       cont_SUM=self.CPD3[str(parent)][str(kk)+str(ii)]['coefficient'][0][CPD_entry]*self.Node[kk][-1]
-                       temp=temp+cont_SUM
-                intercept=np.random.normal(0,self.CPD3[str(parent)]['sigma_intercept'][CPD_entry],1)
-                self.Node[ii].extend(self.Gaussian_select(temp+intercept,self.CPD3[str(parent)]['sigma'][CPD_entry],ii))
-                self.loopbacks2=loopbacks_temp.copy()
-            
-            elif(all(self.Node_Type[jj]=='C' for jj in self.Parent3[str(ii)])):
-                C_Parent=[kk for kk in self.Parent3[str(ii)] if self.Node_Type[kk]=='C'] 
-                temp=0
-                loopbacks_temp=self.loopbacks2.copy()
-                for count3,kk in enumerate(C_Parent):
-                   loopbacks_keys=tsBNgen.int_to_str(kk)+str(ii)
-                   if(loopbacks_keys in self.loopbacks2.keys()): 
-                       if(self.top_order.index(kk) < count):  
-                           for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]):
-                              cont_SUM=self.CPD3[str(parent)][str(kk)+str(ii)]['coefficient'][mm][0]*self.Node[kk][-1-mm]
-                              temp=temp+cont_SUM
-                       else: 
-                           for count3,mm in enumerate(self.loopbacks2[loopbacks_keys]): 
-                               LP=mm-1 
-                               cont_SUM=self.CPD3[str(parent)][str(kk)+str(ii)]['coefficient'][LP][0]*self.Node[kk][-1-LP]
-                               temp=temp+cont_SUM
-                       del self.loopbacks[loopbacks_keys]
-                   elif(kk != ii):
-                       cont_SUM=self.CPD3[str(parent)][str(kk)+str(ii)]['coefficient'][0][0]*self.Node[kk][-1]
-                       temp=temp+cont_SUM
-                intercept=np.random.normal(0,self.CPD3[str(parent)]['sigma_intercept'][0],1)
-                self.Node[ii].extend(self.Gaussian_select(temp+intercept,self.CPD3[str(parent)]['sigma'][0],ii))
-                self.loopbacks2=loopbacks_temp.copy()
+        self._sample_slice(2)
 
-    
-    def BN_sample_gen_loopback(self):
+    def BN_sample_gen_loopback(self,batched=True,output='array',dtype=np.float64,seed=None,n_jobs=1,block_size=BLOCK_SIZE,counter=False,lengths=None):
         '''
         Generate time series data for all the nodes for all time. See Notes for the more information.
 
         Parameters
         -------------
-        None
+        batched : bool
+            If True (default) all the series are generated at once with BatchSampler.
+            Otherwise the series are generated one by one.
+
+        output, dtype, seed, n_jobs, block_size, counter, lengths :
+            See BN_data_gen.
 
         Returns
         -------------
-        None
+        ndarray or list
+            See BN_data_gen.
 
         Raises
         ------------
@@ -795,9 +1440,12 @@ class tsBNgen:
         This is more general form of BN_data_gen that supports only two different BN structures 
         or loopback value of maximum one for all the nodes.
         '''
+        if batched:
+            return self._batch_gen(self._loopback_switch(),output,dtype,seed,n_jobs,block_size,counter,lengths=lengths)
+        self._reset_run()
+        Max_loopback=max(sum(self.loopbacks2.values(),[]))
         keys = range(len(self.Node)) 
         self.BN_Nodes= dict(zip(keys, ([[] for ii in range(self.N)] for _ in keys )))
-        Max_loopback=max(sum(self.loopbacks2.values(),[]))
 
         if (self.custom_time == 0):
             for ii in range(self.N):